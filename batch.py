@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+import sys
+import json
+import multiprocessing
+import time
+import command_line
+import frankenstein
+import git
+
+"""Reads the manifest of a batch.
+
+The manifest is a JSON document with the list of copies to make.
+Each copy has a source (the existing repository), a target (the name of the repository to create),
+and the email and name of the user.
+
+Args:
+	manifest: The path to the manifest.
+
+Returns:
+	The copies, as a Python array of dictionaries.
+"""
+def read_manifest(manifest):
+	json_data = open(manifest)
+	copies = json.load(json_data)
+	json_data.close()
+	return copies
+
+
+"""Prepares the existing repositories of a batch.
+
+Each source is cloned only once, whatever the number of copies made from it.
+Its logs (and patches for the patches and index methods) are also dumped once, so that the copies only read them.
+The objects left out by a partial clone are fetched once too.
+For a dry run, nothing is cloned or dumped (see frankenstein.get_repository).
+With the shared and pack methods, the copies borrow the objects of the source through git alternates:
+the objects are stored once on disk for all the copies.
+
+Args:
+	copies: The copies of the batch.
+	options: The command line options.
+
+Returns:
+	A dictionary with the folder of the repository for each source, None if it couldn't be prepared.
+"""
+def prepare_sources(copies, options):
+	repositories = {}
+	for copy in copies:
+		source = copy['source']
+		if source in repositories:
+			continue
+		try:
+			repository = frankenstein.get_repository(source, options)
+			(histogram, logs) = frankenstein.load_history(repository, 'dry-run' not in options)
+			if logs != None and 'dry-run' not in options:
+				# The copies share the clone, the objects left out by a partial clone must be fetched before they start:
+				git.fetch_missing_objects(repository)
+				if options.get('rebuild') in ('patches', 'index'):
+					git.dump_commits(repository, logs)
+					print()
+			repositories[source] = repository
+		except Exception as error:
+			print("Could not prepare %s: %s" % (source, error))
+			repositories[source] = None
+	return repositories
+
+
+"""Makes a copy of the batch.
+
+This function is run in the processes of the pool.
+
+Args:
+	job: A tuple with the copy, the folder of the existing repository (None if it couldn't be prepared) and the command line options.
+
+Returns:
+	The summary of the copy, as a dictionary.
+"""
+def make_copy(job):
+	(copy, repository, options) = job
+	summary = {'source': copy['source'], 'target': copy['target']}
+	if repository == None:
+		summary['status'] = 'failed'
+		summary['error'] = "The source couldn't be prepared."
+		summary['seconds'] = 0
+		return summary
+
+	start_time = time.time()
+	try:
+		result = frankenstein.run(repository, copy['target'], copy['email'], copy['name'], options)
+		if result == None:
+			summary['status'] = 'not enough commits'
+		else:
+			summary.update(result)
+			summary['status'] = 'done'
+	except Exception as error:
+		summary['status'] = 'failed'
+		summary['error'] = str(error)
+	summary['seconds'] = time.time() - start_time
+	return summary
+
+
+"""Makes all the copies of a batch in a pool of processes.
+
+Args:
+	copies: The copies of the batch.
+	options: The command line options.
+	jobs: The number of processes making copies.
+
+Returns:
+	The summaries of the copies, in the order of the manifest.
+"""
+def run_batch(copies, options, jobs):
+	repositories = prepare_sources(copies, options)
+
+	# The jobs option is for the batch, the copies must not start their own pools:
+	copy_options = dict(options)
+	copy_options.pop('jobs', None)
+	# The missing objects were fetched by prepare_sources, the copies only read them:
+	copy_options['no-fetch'] = True
+	pool = multiprocessing.Pool(jobs)
+	summaries = pool.map(make_copy, [(copy, repositories[copy['source']], copy_options) for copy in copies])
+	pool.close()
+	pool.join()
+	return summaries
+
+
+"""Makes several copies of existing repositories concurrently.
+
+Usage: batch.py [--jobs=<number>] [--rebuild=<method>] [--bare|--partial] [--summary=<file>] <manifest>
+
+Args:
+	manifest: The JSON document listing the copies to make.
+	number: The number of copies made at the same time (the number of processors by default).
+	method: The method used to rebuild the repositories (shared by default, see frankenstein.py).
+	bare: Clone the sources as bare repositories.
+	partial: Clone the sources as bare repositories without the blobs, which are fetched only to rebuild.
+	file: The path to the JSON document where the summaries of the copies are written.
+"""
+if __name__ == "__main__":
+	(arguments, options) = command_line.parse_arguments(sys.argv[1:])
+	if len(arguments) < 1:
+		print("Usage: batch.py [--jobs=<number>] [--rebuild=<method>] [--bare|--partial] [--summary=<file>] <manifest>")
+		sys.exit(2)
+
+	jobs = options.get('jobs', True)
+	if jobs == True:
+		jobs = multiprocessing.cpu_count()
+	options.setdefault('rebuild', 'shared')
+
+	summaries = run_batch(read_manifest(arguments[0]), options, int(jobs))
+	print()
+	for summary in summaries:
+		print("%s -> %s: %s (%s, %d commits, %.1fs)" % (summary['source'], summary['target'], summary['status'], summary.get('strategy'), summary.get('commits', 0), summary['seconds']))
+	if 'summary' in options:
+		json_data = open(options['summary'], 'w')
+		json.dump(summaries, json_data, indent=2)
+		json_data.close()
+
+	if any([summary['status'] == 'failed' for summary in summaries]):
+		sys.exit(1)
+	sys.exit(0)
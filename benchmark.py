@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+import sys
+import os
+import json
+import random
+import shutil
+import subprocess
+import tempfile
+import time
+import datetime
+import commit_log
+import command_line
+import frankenstein
+import git
+import git_pixel
+import instrument
+
+"""Generates a synthetic git repository.
+
+The history is written with a single git fast-import stream, so no network access is needed.
+The authors are named author0, author1... with the email addresses authorN@example.com.
+The commit dates are spread over the period, either uniformly or in bursts:
+with bursts, the commits are grouped in periods of intense activity, as for releases.
+Each commit modifies some of the files of the repository.
+
+Args:
+	name: The name of the directory for the repository.
+	commits: The number of commits.
+	authors: The number of authors.
+	days: The length of the period of the commits, in days, ending today.
+	files: The number of files in the repository.
+	churn: The number of files modified by each commit.
+	distribution: The distribution of the dates, uniform or bursts.
+	seed: The seed for the random number generator.
+"""
+def generate_repository(name, commits, authors, days, files, churn, distribution = 'uniform', seed = 0):
+	generator = random.Random(seed)
+	end_date = int(time.time())
+	start_date = end_date - days * 24 * 3600
+	if distribution == 'bursts':
+		centers = [generator.randint(start_date, end_date) for i in range(0, max(1, days // 30))]
+		dates = [min(end_date, max(start_date, int(generator.gauss(generator.choice(centers), 5 * 24 * 3600)))) for i in range(0, commits)]
+	else:
+		dates = [generator.randint(start_date, end_date) for i in range(0, commits)]
+	dates.sort()
+
+	subprocess.check_call(('git', 'init', '-q', name))
+	process = subprocess.Popen(('git', 'fast-import', '--quiet'), cwd=name, stdin=subprocess.PIPE)
+	for i in range(0, commits):
+		author = "author%d" % (generator.randrange(0, authors))
+		email = "%s@example.com" % (author)
+		modified_files = []
+		for num_file in generator.sample(range(0, files), min(churn, files)):
+			modified_files.append(("file%d.txt" % (num_file), ("file %d, commit %d\n" % (num_file, i)).encode('utf-8')))
+		git.write_fast_import_commit(process.stdin, 'refs/heads/master', author, email, dates[i], author, email, dates[i], "Commit %d" % (i), files=modified_files)
+	process.stdin.close()
+	process.wait()
+	subprocess.check_call(('git', 'symbolic-ref', 'HEAD', 'refs/heads/master'), cwd=name)
+	subprocess.check_call(('git', 'reset', '-q', '--hard'), cwd=name)
+
+
+"""Runs each stage of the program on a synthetic repository and measures it.
+
+The stages are run in a temporary directory, which is removed at the end.
+
+Args:
+	parameters: The parameters of the synthetic repository and of the stages, as a dictionary.
+
+Returns:
+	The measures of the stages, as given by instrument.
+"""
+def run_benchmark(parameters):
+	directory = tempfile.mkdtemp(prefix='frankenstein-benchmark-')
+	current_directory = os.getcwd()
+	os.chdir(directory)
+	del instrument.PHASES[:]
+	try:
+		with instrument.phase('generate'):
+			generate_repository('source', parameters['commits'], parameters['authors'], parameters['days'], parameters['files'], parameters['churn'], parameters['distribution'], parameters['seed'])
+		# The logs are a CommitLog, as in frankenstein.py:
+		with instrument.phase('dump_logs'):
+			logs = commit_log.dump_logs('source')
+		with instrument.phase('find_50commits_month'):
+			frankenstein.find_50commits_month(logs)
+		with instrument.phase('find_contributor_50commits_month'):
+			frankenstein.find_contributor_50commits_month(logs)
+
+		# The rebuild measures its own phases (fetch, dump_commits for the patches and index methods, and rebuild):
+		options = {'rebuild': parameters['rebuild'], 'jobs': parameters['jobs']}
+		frankenstein.rebuild(options, 'source', logs, 'copy', 'Benchmark', 'benchmark@example.com', 'all', len(logs) - 1)
+
+		git_pixel.create_repository('pixels')
+		start_date = int(time.mktime(datetime.date(year=2013, month=11, day=3).timetuple()))
+		dates = git_pixel.compute_dates(start_date, git_pixel.compute_string_encoding(parameters['string']))
+		with instrument.phase('draw_pixels'):
+			if parameters['engine'] == 'fast-import':
+				git_pixel.draw_pixels_batch('pixels', 'Benchmark', 'benchmark@example.com', dates)
+			elif parameters['engine'] == 'pack':
+				git_pixel.draw_pixels_pack('pixels', 'Benchmark', 'benchmark@example.com', dates)
+			else:
+				git_pixel.draw_pixels('pixels', 'Benchmark', 'benchmark@example.com', dates)
+	finally:
+		os.chdir(current_directory)
+		shutil.rmtree(directory)
+	return list(instrument.PHASES)
+
+
+"""Measures the stages of the program on synthetic repositories.
+
+Usage: benchmark.py [--commits=<n>] [--authors=<n>] [--days=<n>] [--files=<n>] [--churn=<n>] [--distribution=<distribution>]
+                    [--seed=<n>] [--jobs=<n>] [--rebuild=<method>] [--engine=<engine>] [--string=<string>] [--output=<file>]
+
+The results are appended to the output file as a JSON document per line, with the parameters and the measures of each stage.
+Each run is thus comparable with the previous runs with the same parameters.
+
+Args:
+	commits: The number of commits of the synthetic repository (1000 by default).
+	authors: The number of authors (10 by default).
+	days: The length of the period of the commits, in days (365 by default).
+	files: The number of files (100 by default).
+	churn: The number of files modified by each commit (3 by default).
+	distribution: The distribution of the commit dates, uniform (default) or bursts.
+	seed: The seed for the random number generator (0 by default).
+	jobs: The number of processes extracting the patches (1 by default).
+	method: The method used to rebuild the repository (patches by default, see frankenstein.py).
+	engine: The engine used to draw pixels (commit by default, see git_pixel.py).
+	string: The string to draw (hi by default).
+	output: The file where the results are appended (benchmark.json by default).
+"""
+if __name__ == "__main__":
+	(arguments, options) = command_line.parse_arguments(sys.argv[1:])
+	parameters = {
+		'commits': int(options.get('commits', 1000)),
+		'authors': int(options.get('authors', 10)),
+		'days': int(options.get('days', 365)),
+		'files': int(options.get('files', 100)),
+		'churn': int(options.get('churn', 3)),
+		'distribution': options.get('distribution', 'uniform'),
+		'seed': int(options.get('seed', 0)),
+		'jobs': int(options.get('jobs', 1)),
+		'rebuild': options.get('rebuild', 'patches'),
+		'engine': options.get('engine', 'commit'),
+		'string': options.get('string', 'hi')
+	}
+	output = options.get('output', 'benchmark.json')
+
+	instrument.enable()
+	phases = run_benchmark(parameters)
+	for phase in phases:
+		print("%-35s %8.3fs wall %8.3fs CPU %7d processes" % (phase['phase'], phase['wall-time'], phase['cpu-time'], phase['subprocesses']))
+
+	results = open(output, 'a')
+	results.write(json.dumps({'date': int(time.time()), 'parameters': parameters, 'phases': phases}) + "\n")
+	results.close()
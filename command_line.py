@@ -0,0 +1,22 @@
+#!/usr/bin/env python3
+
+"""Parses the command line arguments.
+
+The options are given as --name=value (or --name for a flag) and can be anywhere in the command line.
+
+Args:
+	arguments: The command line arguments, without the script name.
+
+Returns:
+	A tuple with the list of positional arguments and the dictionary of options.
+"""
+def parse_arguments(arguments):
+	positionals = []
+	options = {}
+	for argument in arguments:
+		if argument.startswith('--'):
+			(name, _, value) = argument[2:].partition('=')
+			options[name] = value if value else True
+		else:
+			positionals.append(argument)
+	return (positionals, options)
@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+import array
+import binascii
+import collections.abc
+import json
+import os
+import time
+import git
+
+"""Git logs stored as columns.
+
+Each field of the commits is stored in its own compact array instead of one dictionary per commit:
+- the hashes of the commits and trees as 20 bytes each;
+- the author and committer dates as 64-bit integers;
+- the authors and committers as identifiers of interned (name, email address) identities;
+- the messages as UTF-8 bytes, only decoded when read.
+The commits can still be read as dictionaries through CommitRow, so a CommitLog can replace the Python array of logs.
+A slice of a CommitLog is a new CommitLog.
+
+Attributes:
+	hashes: The hashes of the commits.
+	trees: The hashes of the trees.
+	author_ids: The identifiers of the authors.
+	author_dates: The author dates, as timestamps.
+	committer_ids: The identifiers of the committers.
+	committer_dates: The committer dates, as timestamps.
+	messages: The messages, concatenated.
+	message_offsets: The offsets of the messages, the message N is between the offsets N and N + 1.
+	identities: The (name, email address) of each identifier.
+	identity_ids: The identifier of each (name, email address).
+"""
+class CommitLog:
+	def __init__(self, logs = []):
+		self.hashes = bytearray()
+		self.trees = bytearray()
+		self.author_ids = array.array('l')
+		self.author_dates = array.array('q')
+		self.committer_ids = array.array('l')
+		self.committer_dates = array.array('q')
+		self.messages = bytearray()
+		self.message_offsets = array.array('q', [0])
+		self.identities = []
+		self.identity_ids = {}
+		self.extend(logs)
+
+	"""Adds commits at the end of the logs.
+
+	The commits are read one by one, so they can come from a generator such as git.iter_logs.
+
+	Args:
+		logs: The commits as Python dictionaries.
+	"""
+	def extend(self, logs):
+		for log in logs:
+			self.append(log)
+
+	"""Adds a commit at the end of the logs.
+
+	Args:
+		log: The commit as a Python dictionary.
+	"""
+	def append(self, log):
+		self.hashes += binascii.unhexlify(log['hash'])
+		self.trees += binascii.unhexlify(log['tree'])
+		self.author_ids.append(self.intern(log['author'], log['author-email']))
+		self.author_dates.append(log['author-date'])
+		self.committer_ids.append(self.intern(log['committer'], log['committer-email']))
+		self.committer_dates.append(log['committer-date'])
+		self.messages += log['message'].encode('utf-8')
+		self.message_offsets.append(len(self.messages))
+
+	"""Gets the identifier of an identity, adding it if needed.
+
+	Args:
+		name: The name.
+		email: The email address.
+
+	Returns:
+		The identifier of the identity.
+	"""
+	def intern(self, name, email):
+		identity = (name, email)
+		identity_id = self.identity_ids.get(identity)
+		if identity_id == None:
+			identity_id = len(self.identities)
+			self.identities.append(identity)
+			self.identity_ids[identity] = identity_id
+		return identity_id
+
+	def __len__(self):
+		return len(self.author_dates)
+
+	def __iter__(self):
+		for i in range(0, len(self)):
+			yield CommitRow(self, i)
+
+	def __getitem__(self, key):
+		if isinstance(key, slice):
+			(start, stop, step) = key.indices(len(self))
+			sliced = CommitLog()
+			if step != 1:
+				for i in range(start, stop, step):
+					sliced.append(CommitRow(self, i))
+				return sliced
+			# Contiguous slices copy whole parts of the columns:
+			stop = max(start, stop)
+			sliced.hashes = self.hashes[20 * start:20 * stop]
+			sliced.trees = self.trees[20 * start:20 * stop]
+			sliced.author_ids = self.author_ids[start:stop]
+			sliced.author_dates = self.author_dates[start:stop]
+			sliced.committer_ids = self.committer_ids[start:stop]
+			sliced.committer_dates = self.committer_dates[start:stop]
+			first_offset = self.message_offsets[start]
+			sliced.messages = self.messages[first_offset:self.message_offsets[stop]]
+			sliced.message_offsets = array.array('q', [offset - first_offset for offset in self.message_offsets[start:stop + 1]])
+			sliced.identities = list(self.identities)
+			sliced.identity_ids = dict(self.identity_ids)
+			return sliced
+		if key < 0:
+			key += len(self)
+		if key < 0 or key >= len(self):
+			raise IndexError("Commit number out of range.")
+		return CommitRow(self, key)
+
+
+"""A commit from a CommitLog, seen as a dictionary.
+
+The dates, authors and committers can be changed; the changes are written to the CommitLog.
+
+Attributes:
+	log: The CommitLog.
+	index: The number of the commit.
+"""
+class CommitRow(collections.abc.Mapping):
+	def __init__(self, log, index):
+		self.log = log
+		self.index = index
+
+	def __getitem__(self, field):
+		log = self.log
+		i = self.index
+		if field == 'hash':
+			return binascii.hexlify(log.hashes[20 * i:20 * (i + 1)]).decode('ascii')
+		if field == 'tree':
+			return binascii.hexlify(log.trees[20 * i:20 * (i + 1)]).decode('ascii')
+		if field == 'author':
+			return log.identities[log.author_ids[i]][0]
+		if field == 'author-email':
+			return log.identities[log.author_ids[i]][1]
+		if field == 'author-date':
+			return log.author_dates[i]
+		if field == 'committer':
+			return log.identities[log.committer_ids[i]][0]
+		if field == 'committer-email':
+			return log.identities[log.committer_ids[i]][1]
+		if field == 'committer-date':
+			return log.committer_dates[i]
+		if field == 'message':
+			return log.messages[log.message_offsets[i]:log.message_offsets[i + 1]].decode('utf-8')
+		raise KeyError(field)
+
+	def __setitem__(self, field, value):
+		log = self.log
+		i = self.index
+		if field == 'author-date':
+			log.author_dates[i] = value
+		elif field == 'committer-date':
+			log.committer_dates[i] = value
+		elif field in ('author', 'author-email'):
+			(name, email) = log.identities[log.author_ids[i]]
+			if field == 'author':
+				name = value
+			else:
+				email = value
+			log.author_ids[i] = log.intern(name, email)
+		elif field in ('committer', 'committer-email'):
+			(name, email) = log.identities[log.committer_ids[i]]
+			if field == 'committer':
+				name = value
+			else:
+				email = value
+			log.committer_ids[i] = log.intern(name, email)
+		else:
+			raise KeyError("The field %s can't be changed." % (field))
+
+	def __iter__(self):
+		for (field, placeholder) in git.LOG_FIELDS:
+			yield field
+
+	def __len__(self):
+		return len(git.LOG_FIELDS)
+
+
+"""Gets a field of all the commits.
+
+The dates of a CommitLog are returned directly, without reading the commits one by one.
+
+Args:
+	logs: The git logs as a Python array or a CommitLog.
+	field: The name of the field.
+
+Returns:
+	The values of the field, in the order of the commits.
+"""
+def column(logs, field):
+	if isinstance(logs, CommitLog):
+		if field == 'author-date':
+			return logs.author_dates
+		if field == 'committer-date':
+			return logs.committer_dates
+		if field in ('author-email', 'committer-email'):
+			emails = [email for (name, email) in logs.identities]
+			ids = logs.author_ids if field == 'author-email' else logs.committer_ids
+			return [emails[identity_id] for identity_id in ids]
+	return [log[field] for log in logs]
+
+
+"""Sets a field for consecutive commits.
+
+The dates of a CommitLog are set directly in their column.
+
+Args:
+	logs: The git logs as a Python array or a CommitLog.
+	field: The name of the field.
+	start: The number of the first commit to change.
+	values: The new values of the field, in the order of the commits.
+"""
+def set_column(logs, field, start, values):
+	if isinstance(logs, CommitLog) and field in ('author-date', 'committer-date'):
+		dates = logs.author_dates if field == 'author-date' else logs.committer_dates
+		dates[start:start + len(values)] = array.array('q', values)
+		return
+	for i in range(0, len(values)):
+		logs[start + i][field] = values[i]
+
+
+"""Computes the times in the day of timestamps.
+
+The times are in local time, in seconds since midnight.
+The offset of the local time zone is only computed once per hour of timestamps.
+
+Args:
+	dates: The timestamps.
+
+Returns:
+	The times in the day, as an array.
+"""
+def times_of_day(dates):
+	times = array.array('l')
+	offsets = {}
+	for date in dates:
+		hour = date // 3600
+		offset = offsets.get(hour)
+		if offset == None:
+			offset = time.localtime(date).tm_gmtoff
+			offsets[hour] = offset
+		times.append((date + offset) % (24 * 3600))
+	return times
+
+
+"""The name of the cache of the git logs, in the git directory of the repository.
+
+The version of the format is part of the name, so the caches written in another format are ignored.
+"""
+CACHE = 'logs-v1.columns'
+
+"""The columns of a CommitLog saved in the cache, in order.
+"""
+COLUMNS = ('hashes', 'trees', 'author_ids', 'author_dates', 'committer_ids', 'committer_dates', 'messages', 'message_offsets')
+
+
+"""Saves git logs in a file, in columns.
+
+The file starts with a JSON header holding the identities and the length of each column, on one line.
+The columns follow, as their raw bytes.
+The file is written under a temporary name first, so an interrupted save leaves the previous file.
+
+Args:
+	logs: The git logs as a CommitLog.
+	path: The path to the file.
+"""
+def save_logs(logs, path):
+	header = {
+		'identities': logs.identities,
+		'lengths': [len(getattr(logs, name)) for name in COLUMNS]
+	}
+	data = open(path + '.tmp', 'wb')
+	data.write(json.dumps(header).encode('utf-8') + b"\n")
+	for name in COLUMNS:
+		data.write(getattr(logs, name))
+	data.close()
+	os.replace(path + '.tmp', path)
+
+
+"""Loads git logs saved in columns by save_logs.
+
+The columns are read directly in their arrays, without building a dictionary per commit.
+
+Args:
+	path: The path to the file.
+
+Returns:
+	The git logs as a CommitLog, None if there is no file or if it is truncated.
+"""
+def load_logs(path):
+	if not os.path.isfile(path):
+		return None
+	data = open(path, 'rb')
+	try:
+		header = json.loads(data.readline().decode('utf-8'))
+		logs = CommitLog()
+		logs.identities = [tuple(identity) for identity in header['identities']]
+		logs.identity_ids = dict([(identity, i) for (i, identity) in enumerate(logs.identities)])
+		for (name, length) in zip(COLUMNS, header['lengths']):
+			column = getattr(logs, name)
+			if isinstance(column, bytearray):
+				column = bytearray(length)
+				if data.readinto(column) != length:
+					return None
+			else:
+				column = array.array(column.typecode)
+				column.fromfile(data, length)
+			setattr(logs, name, column)
+	except (ValueError, KeyError, EOFError):
+		return None
+	finally:
+		data.close()
+	return logs
+
+
+"""Dumps the logs from a git repository, in columns.
+
+The commits read from git log fill the columns of a CommitLog directly, one by one,
+and the logs are saved in columns in the git directory of the repository (see save_logs).
+If the logs were already dumped, only the commits added since are read:
+nothing is read if HEAD didn't change and the logs are read again entirely if the former HEAD is no longer in the history.
+
+Args:
+	repository: The name of the folder where the repository is.
+	save: False to only read the logs, without saving them in the repository.
+
+Returns:
+	The logs as a CommitLog.
+"""
+def dump_logs(repository, save = True):
+	head = git.get_head(repository)
+	path = os.path.join(git.get_git_directory(repository), CACHE)
+	logs = load_logs(path)
+
+	if logs != None and len(logs) > 0 and logs[-1]['hash'] == head:
+		return logs
+	if logs != None and len(logs) > 0 and git.is_ancestor(repository, logs[-1]['hash'], head):
+		logs.extend(git.iter_logs(repository, '%s..%s' % (logs[-1]['hash'], head)))
+	else:
+		logs = CommitLog(git.iter_logs(repository, head))
+
+	if save:
+		save_logs(logs, path)
+	return logs
@@ -1,60 +1,131 @@
 #!/usr/bin/env python3
 import sys
+import os
+import array
 import gauss
 import random
 import re
 import datetime
 import git
+import history
+import commit_log
+import command_line
+import instrument
+import planner
+import multiprocessing
 import time
 
+"""Finds the latest streak of commits in a window of time.
+
+The commits are sorted by author date first: the logs are in commit order,
+so rebased or cherry-picked commits can have author dates older than the commits before them.
+Then, a window slides over the commits with two pointers, so each commit is visited at most twice.
+
+Args:
+	commits: The commits as a list of tuples with the author date and the number of the commit, in any order.
+	days: The length of the window, in days.
+	min_commits: The minimum number of commits in the window.
+
+Returns:
+	A tuple with the number of the last commit from the latest streak (-1 if no streak is found)
+	and the largest number of commits found in a window.
+"""
+def find_streak(commits, days, min_commits):
+	commits = sorted(commits)
+	window = days * 24 * 3600
+	last_commit = -1
+	max_commits = 0
+	start = 0
+	for end in range(0, len(commits)):
+		while commits[end][0] - commits[start][0] > window:
+			start += 1
+		nb_commits = end - start + 1
+		if nb_commits >= min_commits:
+			last_commit = commits[end][1]
+		if nb_commits > max_commits:
+			max_commits = nb_commits
+	return (last_commit, max_commits)
+
+
 """Find a streak of 50 commits in a month.
 
 It actually searches for a streak in 29 days.
-The search starts with the last commit so that the the lastest streak will be returned.
+The lastest streak is returned.
 The author dates are used as reference dates.
 It is possible to specify an author (via his email address) to whom all commits must belong.
 
 Args:
 	logs: The git logs as a Python array.
 	author: The author for the streak or None if no author is needed.
+	days: The length of the month, in days.
+	min_commits: The minimum number of commits in the month.
 
 Returns:
 	The number of the last commit from the streak.
 	-1 if no streak is found.
 """
-def find_50commits_month(logs, author = None):
-	for i in range(len(logs)-1, 50, -1):
-		nb_commits = 0
-		for j in range(i-1, 0, -1):
-			if author != None and logs[j]['author-email'] == author:
-				period = logs[i]['author-date'] - logs[j]['author-date']
-				if period > 29 * 24 * 3600:
-					break
-				if nb_commits >= 50:
-					return i
-				nb_commits += 1
-	return -1
+def find_50commits_month(logs, author = None, days = 29, min_commits = 50):
+	dates = commit_log.column(logs, 'author-date')
+	if author == None:
+		commits = list(zip(dates, range(0, len(dates))))
+	else:
+		emails = commit_log.column(logs, 'author-email')
+		commits = [(dates[i], i) for i in range(0, len(dates)) if emails[i] == author]
+	return find_streak(commits, days, min_commits)[0]
+
+
+"""Ranks the contributors who made 50 commits in a month.
+
+The commits are grouped per author email address in a single pass over the logs.
+Then, the streaks of all the authors are searched at once.
+
+Args:
+	logs: The git logs as a Python array.
+	days: The length of the month, in days.
+	min_commits: The minimum number of commits in the month.
+
+Returns:
+	A list of tuples with the contributor email address, the number of the last commit from his latest streak
+	and the largest number of commits he made in a month.
+	The contributors with the most commits in a month come first.
+"""
+def rank_contributor_streaks(logs, days = 29, min_commits = 50):
+	dates = commit_log.column(logs, 'author-date')
+	emails = commit_log.column(logs, 'author-email')
+	commits_per_author = {}
+	for i in range(0, len(dates)):
+		commits_per_author.setdefault(emails[i], []).append((dates[i], i))
+
+	ranking = []
+	for (contributor, commits) in commits_per_author.items():
+		if len(commits) < min_commits:
+			continue
+		(num_commit, max_commits) = find_streak(commits, days, min_commits)
+		if num_commit != -1:
+			ranking.append((contributor, num_commit, max_commits))
+	ranking.sort(key=lambda streak: (streak[2], streak[1]), reverse=True)
+	return ranking
 
 
 """Find a contributor who made 50 commits in a month.
 
-Iterates on all the contributors until it finds one with 50 commits in a month.
+Picks the contributor with the most commits in a month.
 
 Args:
-	repository: The name of the folder where the repository is.
 	logs: The git logs as a Python array.
+	days: The length of the month, in days.
+	min_commits: The minimum number of commits in the month.
 
 Returns:
 	A tuple with the contributor email address and the number of the last commit from the streak he made.
 	A tuple with None and -1 if no contributor streak is found.
 """
-def find_contributor_50commits_month(repository, logs):
-	contributors = git.get_contributors(repository)
-	for contributor in contributors:
-		num_commit = find_50commits_month(logs, contributor)
-		if num_commit != -1:
-			return (contributor, num_commit)
-	return (None, -1)
+def find_contributor_50commits_month(logs, days = 29, min_commits = 50):
+	ranking = rank_contributor_streaks(logs, days, min_commits)
+	if len(ranking) == 0:
+		return (None, -1)
+	(contributor, num_commit, max_commits) = ranking[0]
+	return (contributor, num_commit)
 
 
 """Computes the time offset to put the last commit today.
@@ -82,125 +153,351 @@ Returns:
 	A tuple with the minimum and maximum of the time period.
 """
 def compute_commit_time_period(logs):
-	min_time = 3600 * 24
-	max_time = 0
-	for i in range(0, len(logs)):
-		log = logs[i]
-		commit_date = datetime.datetime.fromtimestamp(log['author-date'])
-		commit_time = commit_date.hour * 3600 + commit_date.minute * 60 + commit_date.second
-		if commit_time > max_time:
-			max_time = commit_time
-		if commit_time < min_time:
-			min_time = commit_time
-	return (min_time, max_time)
+	times = commit_log.times_of_day(commit_log.column(logs, 'author-date'))
+	if len(times) == 0:
+		return (3600 * 24, 0)
+	return (min(times), max(times))
+
+
+"""Schedules commits over consecutive days.
+
+The times in the day of the commits are drawn from a distribution, usually the times of existing commits.
+The commits of a day are sorted and, if two commits fall on the same second, the later one is pushed back by a second,
+such that the timestamps are strictly increasing.
+
+Args:
+	numbers_of_commits: The number of commits for each day.
+	start_date: The timestamp of the beginning of the first day.
+	times: The times in the day (in seconds) to draw the times of the commits from.
+	generator: The random number generator to use.
+
+Returns:
+	The timestamps of the commits, as an array.
+"""
+def schedule_commits(numbers_of_commits, start_date, times, generator = random):
+	timestamps = array.array('q')
+	for num_day in range(0, len(numbers_of_commits)):
+		day = start_date + num_day * 24 * 3600
+		timestamps.extend(sorted([day + commit_time for commit_time in generator.choices(times, k=numbers_of_commits[num_day])]))
+	for i in range(1, len(timestamps)):
+		if timestamps[i] <= timestamps[i - 1]:
+			timestamps[i] = timestamps[i - 1] + 1
+	return timestamps
 
 
 """Redistributes the last commits of a repository to put at least 50 of them in a month.
 
 Selects 50 or more commits and squashes them into a month.
+The same seed always gives the same dates, so that an interrupted rebuild can be resumed.
+The maximum number of commits squashed is lowered to the number of commits up to the last one, if there are fewer.
+The commits keep the times in the day of the commits selected.
 
 Args:
 	logs: The git logs as a Python array.
 	num_commit: The number of the last commit from the 50 we want to squash.
+	days: The length of the month, in days.
+	min_commits: The minimum number of commits to squash.
+	max_commits: The maximum number of commits to squash.
+	seed: The seed for the random number generator or None for a random seed.
 """
-def redistribute_commits(logs, num_commit):
-	numbers_of_commits = gauss.generate_in_range(5.0/3, 29, 50, 60)
-	if len(numbers_of_commits) != 29:
-		raise("Incorrect number of commit numbers generated by the Gauss distribution.")
+def redistribute_commits(logs, num_commit, days = 29, min_commits = 50, max_commits = 60, seed = None):
+	max_commits = min(max_commits, num_commit + 1)
+	if max_commits < min_commits:
+		raise Exception("Not enough commits to redistribute %d of them." % (min_commits))
+	generator = random.Random(seed)
+	numbers_of_commits = gauss.sample_in_range(min_commits / days, days, min_commits, max_commits, generator)
 	total_commits = sum(numbers_of_commits)
 	start_commit = num_commit - total_commits + 1
-	end_commit = num_commit
-	(min_time, max_time) = compute_commit_time_period(logs[start_commit: end_commit])
+
+	times = commit_log.times_of_day(commit_log.column(logs, 'author-date')[start_commit:num_commit + 1])
 	start_date = int(time.mktime(datetime.datetime.fromtimestamp(logs[start_commit]['author-date']).date().timetuple()))
-	num_commit = start_commit
-	for num_day in range(0, 29):
-		day = start_date + num_day * 24 * 3600
-		for i in range(0, numbers_of_commits[num_day]):
-			commit_time = random.randint(min_time, max_time)
-			timestamp = day + commit_time
-			logs[num_commit]['author-date'] = timestamp
-			logs[num_commit]['committer-date'] = timestamp
-			num_commit += 1
+	timestamps = schedule_commits(numbers_of_commits, start_date, times, generator)
+	commit_log.set_column(logs, 'author-date', start_commit, timestamps)
+	commit_log.set_column(logs, 'committer-date', start_commit, timestamps)
 
 
-"""Try different methods to add 50 commits in a month to the user from an existing repository.
+"""Rebuilds the new repository with the method selected.
 
-Usage: frankenstein.py <repository> <new-name> <your-email> <your-name>
+The methods available are:
+- patches: replays patches of each commit in a working tree (default);
+- index: same as patches, but the patches are applied to an index only and the working tree is checked out once at the end;
+- fast-import: writes all the commits in a single git fast-import stream;
+- shared: writes only the new commits in a bare repository sharing the objects of the existing repository;
+- pack: same as shared, but the new commits are written in a packfile without any git process;
+- pipeline: same as patches, but the commits are made while the patches are extracted.
+
+The objects left out by a partial clone are fetched first, unless the no-fetch option is given (they were already fetched).
+If the new repository is an interrupted rebuild, the offset of that rebuild is kept to resume it.
+The patches are extracted by as many processes as the jobs option specifies (all the processors if no number is given).
 
 Args:
+	options: The command line options, with the name of the method to use as rebuild option.
 	repository: The existing repository.
-	new_name: The name of the repository to be created.
-	your_email: The email of the user (must be linked to his GitHub account).
-	your_name: The name of the user (will appear on GitHub).
+	logs: The git logs as a Python array.
+	new_repository: The name of the repository to be created.
+	your_name: The name of the user.
+	your_email: The email of the user.
+	contributors: The contributors to replace or all to replace all of them.
+	num_commit: The number of the commit to put today.
+	seed: The seed of the redistributed dates, recorded to resume the rebuild (None if the dates weren't redistributed).
 """
-if __name__ == "__main__":
-	if len(sys.argv) < 5:
-		print("Usage: frankenstein.py <repository> <new-name> <your-email> <your-name>")
-		sys.exit(2)
+def rebuild(options, repository, logs, new_repository, your_name, your_email, contributors, num_commit, seed = None):
+	method = options.get('rebuild', 'patches')
+	jobs = options.get('jobs', 1)
+	if jobs == True:
+		jobs = multiprocessing.cpu_count()
+	offset = compute_offset(logs, num_commit)
+	# An interrupted rebuild is resumed with its own offset, the current time has changed since:
+	parameters = git.read_journal_parameters(new_repository)
+	if parameters != None:
+		offset = parameters['offset']
+	if 'no-fetch' not in options:
+		with instrument.phase('fetch'):
+			git.fetch_missing_objects(repository)
+	if method in ('patches', 'index'):
+		# Dumps the commits from the repository in a patch archive:
+		print("Dumping commits in patches...")
+		with instrument.phase('dump_commits'):
+			git.dump_commits(repository, logs, int(jobs))
+		print()
+		rebuild_repository = git.rebuild_repository
+		if method == 'index':
+			rebuild_repository = git.index_repository
+	elif method == 'fast-import':
+		rebuild_repository = git.fast_import_repository
+	elif method == 'shared':
+		rebuild_repository = git.share_repository
+	elif method == 'pipeline':
+		rebuild_repository = git.pipeline_repository
+	elif method == 'pack':
+		rebuild_repository = git.pack_repository
+	else:
+		raise Exception("Unknown rebuild method %s." % (method))
+	arguments = {}
+	if method in ('patches', 'index', 'pipeline'):
+		# The methods with a journal record the seed, to resume with the same dates:
+		arguments['seed'] = seed
+	with instrument.phase('rebuild'):
+		rebuild_repository(repository, logs, new_repository, your_name, your_email, contributors, offset, **arguments)
+
+
+"""Gets the folder of the existing repository, cloning it if needed.
+
+If the source is an URL we need to download the repository first.
+Local repositories are also cloned if a bare or partial clone is requested.
+For a dry run, nothing is cloned: the clone must already exist and isn't updated.
 
-	source = sys.argv[1]
-	new_repository = sys.argv[2]
-	your_email = sys.argv[3]
-	your_name = sys.argv[4]
+Args:
+	source: The existing repository, as a HTTP(S) or file URL or a local path.
+	options: The command line options.
 
-	# If the source is an URL we need to download the repository first.
-	repository = source
-	matches = re.match(r'https?:\/\/.+\/([^\/]+)(\.git)?$', source)
-	if matches:
-		repository = git.clone_repository(source)
+Returns:
+	The folder where the repository is.
+"""
+def get_repository(source, options):
+	matches = re.match(r'(https?|file):\/\/', source)
+	if not matches and 'bare' not in options and 'partial' not in options:
+		return source
+	if 'dry-run' in options:
+		repository = git.get_clone_directory(source, 'bare' in options, 'partial' in options)
+		if not os.path.isdir(repository):
+			raise Exception("%s isn't cloned in %s yet, a dry run doesn't clone it." % (source, repository))
+		return repository
+	return git.clone_repository(source, 'bare' in options, 'partial' in options)
 
-	# Dumps the git logs from the repository to a JSON document.
-	logs = git.dump_logs(repository)
+
+"""Loads the daily commit histogram and the git logs of a repository.
+
+The histogram saved by a previous run on the same commit is reused.
+Otherwise, the histogram is built from the git logs.
+
+Args:
+	repository: The name of the folder where the repository is.
+	save: False to only read the repository, without saving the logs and histogram in it.
+
+Returns:
+	A tuple with the daily commit histogram and the git logs, as a CommitLog.
+	The git logs are None if there are less than 50 commits in the repository.
+"""
+def load_history(repository, save = True):
+	logs = None
+	head = git.get_head(repository)
+	histogram = history.load_histogram(repository, head)
+	if histogram == None:
+		logs = commit_log.dump_logs(repository, save)
+		histogram = history.build_histogram(logs, head)
+		if save:
+			history.save_histogram(repository, histogram)
 
 	# We only use existing commits so we need at least 50 of them:
-	if len(logs) < 50:
-		print("Not enough commits in this repository.")
-		sys.exit(1)
+	if history.count_all_commits(histogram) < 50:
+		return (histogram, None)
 
-	# Dumps the commits from the repository as .patch files:
-	print("Dumping commits in patches...")
-	git.dump_commits(repository, logs)
-	print()
+	# Dumps the git logs from the repository directly in columns.
+	if logs == None:
+		logs = commit_log.dump_logs(repository, save)
+	return (histogram, logs)
 
+
+"""Finds how to put 50 commits in a month under the name of the user.
+
+The strategies are tried in order:
+- own: the user made 50 commits in a month, they are kept under his name;
+- contributor: a contributor made 50 commits in a month, he is replaced with the user;
+- month: there are 50 commits in a month, all contributors are replaced with the user;
+- redistribute: 50 or more commit dates are squashed in a month, all contributors are replaced with the user.
+The last strategy changes the dates in the logs.
+
+Args:
+	logs: The git logs as a CommitLog.
+	histogram: The daily commit histogram.
+	your_email: The email of the user.
+	seed: The seed of the redistributed dates or None for a random seed.
+
+Returns:
+	A tuple with the name of the strategy, the contributors to replace (or all) and the number of the commit to put today.
+"""
+def find_strategy(logs, histogram, your_email, seed = None):
 	# Searches for 50 commits in a month under the name of the user.
 	# Only copy the repository with a time shift to put the streak in the last month if a streak is found.
 	print("Checking if you made 50 commits in a month...")
-	num_commit = find_50commits_month(logs, your_email)
+	num_commit = -1
+	if history.has_streak(histogram, your_email, 29, 50):
+		num_commit = find_50commits_month(logs, your_email)
 	if num_commit != -1:
 		print("You made 50 commits in a month with %dth as last commit" % (num_commit))
-		offset = compute_offset(logs, num_commit)
-		git.rebuild_repository(repository, logs, new_repository, your_name, your_email, [], offset)
-		sys.exit(0)
+		return ('own', [], num_commit)
 	print()
 
 	# Searches for a contributor with 50 commits in a month.
 	# If found, the contributor will be replaced with the user of the script.
 	# During the copy the date will be shifted as before.
 	print("Searching for a contributor with 50 commits in a month...")
-	(contributor, num_commit) = find_contributor_50commits_month(repository, logs)
+	(contributor, num_commit) = find_contributor_50commits_month(logs)
 	if contributor != None:
 		print("%s made 50 commits in a month with %dth as last commit" % (contributor, num_commit))
-		offset = compute_offset(logs, num_commit)
-		git.rebuild_repository(repository, logs, new_repository, your_name, your_email, [contributor], offset)
-		sys.exit(0)
+		return ('contributor', [contributor], num_commit)
 	print()
 
 	# Searches for a month with 50 commits.
 	# If found, all contributors to the project will be replaced with the user of the script.
 	# Then, the date will be shifted during the copy as before.
 	print("Searching for a month with 50 commits...")
-	num_commit = find_50commits_month(logs)
+	num_commit = -1
+	if history.has_streak(histogram, None, 29, 50):
+		num_commit = find_50commits_month(logs)
 	if num_commit != -1:
 		print("50 commits in a month were found ending with commit %d" % (num_commit))
-		offset = compute_offset(logs, num_commit)
-		git.rebuild_repository(repository, logs, new_repository, your_name, your_email, 'all', offset)
-		sys.exit(0)
+		return ('month', 'all', num_commit)
 	print()
 
 	# Squashes 50 or more commit dates to put them in a month.
 	# Then, the date are shifted as before to put the 50 squashed commits in the last month.
 	last_commit = len(logs) - 1
-	redistribute_commits(logs, last_commit)
-	offset = compute_offset(logs, last_commit)
-	git.rebuild_repository(repository, logs, new_repository, your_name, your_email, 'all', offset)
+	redistribute_commits(logs, last_commit, seed=seed)
+	return ('redistribute', 'all', last_commit)
+
+
+"""Copies a repository to add 50 commits in a month to the user.
+
+With the dry-run option, the copy is only planned and printed, the new repository isn't created
+and nothing is written in the existing repository.
+
+Args:
+	repository: The name of the folder where the existing repository is.
+	new_repository: The name of the repository to be created.
+	your_email: The email of the user.
+	your_name: The name of the user.
+	options: The command line options.
+
+Returns:
+	A summary of the copy as a dictionary with the strategy, the contributors replaced,
+	the number of the commit put today and the number of commits copied (and the plan for a dry run).
+	None if there are not enough commits in the repository.
+"""
+def run(repository, new_repository, your_email, your_name, options):
+	with instrument.phase('dump_logs'):
+		(histogram, logs) = load_history(repository, 'dry-run' not in options)
+	if logs == None:
+		print("Not enough commits in this repository.")
+		return None
+
+	# An interrupted rebuild is resumed with the same redistributed dates:
+	parameters = git.read_journal_parameters(new_repository)
+	seed = random.randrange(2 ** 32)
+	if parameters != None and parameters.get('seed') != None:
+		seed = parameters['seed']
+	with instrument.phase('search'):
+		(strategy, contributors, num_commit) = find_strategy(logs, histogram, your_email, seed)
+	if strategy != 'redistribute':
+		seed = None
+	summary = {
+		'repository': repository,
+		'new-repository': new_repository,
+		'strategy': strategy,
+		'contributors': contributors,
+		'last-commit': num_commit,
+		'commits': git.count_past_commits(logs, compute_offset(logs, num_commit))
+	}
+
+	if 'dry-run' in options:
+		costs = planner.COMMIT_COSTS
+		if 'costs' in options:
+			costs = planner.load_costs(options['costs'])
+		with instrument.phase('plan'):
+			summary['plan'] = planner.build_plan(repository, logs, strategy, contributors, num_commit, your_email, costs)
+		print()
+		planner.print_plan(summary['plan'])
+		return summary
+
+	rebuild(options, repository, logs, new_repository, your_name, your_email, contributors, num_commit, seed)
+	return summary
+
+
+"""Try different methods to add 50 commits in a month to the user from an existing repository.
+
+Usage: frankenstein.py [--rebuild=<method>] [--jobs[=<number>]] [--bare|--partial] [--dry-run [--costs=<file>]] [--report=<file>] [--profile=<file>] <repository> <new-name> <your-email> <your-name>
+
+Args:
+	repository: The existing repository, as a HTTP(S) or file URL or a local path.
+	new_name: The name of the repository to be created.
+	your_email: The email of the user (must be linked to his GitHub account).
+	your_name: The name of the user (will appear on GitHub).
+	bare: Clone the repository as a bare repository, without working tree.
+	partial: Clone the repository as a bare repository without the blobs, which are fetched only to rebuild.
+	method: The method used to rebuild the repository (patches, index, fast-import, shared, pack or pipeline).
+	number: The number of processes extracting the patches (all the processors if not given).
+	report: The path to a JSON document where the wall time, CPU time, number of processes and bytes written of each phase are reported.
+	profile: The path to a file where the cProfile statistics of the phases are written.
+	dry-run: Only print the plan of the copy (strategy, dates, contribution graph and estimated cost of each method).
+	costs: The results of benchmark.py to estimate the cost of each method from.
+"""
+if __name__ == "__main__":
+	(arguments, options) = command_line.parse_arguments(sys.argv[1:])
+	if len(arguments) < 4:
+		print("Usage: frankenstein.py [--rebuild=<method>] [--jobs[=<number>]] [--bare|--partial] [--dry-run [--costs=<file>]] [--report=<file>] [--profile=<file>] <repository> <new-name> <your-email> <your-name>")
+		sys.exit(2)
+
+	source = arguments[0]
+	new_repository = arguments[1]
+	your_email = arguments[2]
+	your_name = arguments[3]
+
+	if 'report' in options or 'profile' in options:
+		instrument.enable('profile' in options)
+
+	with instrument.phase('clone'):
+		try:
+			repository = get_repository(source, options)
+		except Exception as error:
+			print(error)
+			sys.exit(1)
+	summary = run(repository, new_repository, your_email, your_name, options)
+
+	if 'report' in options:
+		instrument.write_report(options['report'])
+	if 'profile' in options:
+		instrument.write_profile(options['profile'])
+	if summary == None:
+		sys.exit(1)
 	sys.exit(0)
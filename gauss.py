@@ -1,45 +1,76 @@
 #!/usr/bin/env python3
 import random
 
-"""Generates a set of numbers following a Gaussian distribution.
+"""Samples a set of numbers following a Gaussian distribution and whose sum if in the specified range.
+
+The sum of all the numbers from the set generated must be in the range specified.
+The sum is chosen first, uniformly in the range.
+Then, it is split between the numbers proportionally to Gaussian weights,
+the units left by the rounding going to the largest remainders.
+Thus, the set is generated in one pass, whatever the range.
 
 Args:
 	mean: The mean of the set.
 	length: The size of the set.
+	min_sum: Lower bound of the range, included.
+	max_sum: Upper bound of the range, included.
+	generator: The random number generator to use.
 
 Returns:
 	The set of numbers as a Python array.
 """
-def generate(mean, length):
-	numbers = []
+def sample_in_range(mean, length, min_sum, max_sum, generator = random):
+	total = generator.randint(min_sum, max_sum)
+	weights = []
 	for i in range(0, length):
-		number = (int)(random.gauss(mean, 1))
-		if number >= 0 or number < 4:
-			numbers.append(number)
+		weights.append(max(generator.gauss(mean, 1), 0))
+	weights_sum = sum(weights)
+	if weights_sum == 0:
+		weights = [1] * length
+		weights_sum = length
+
+	shares = [total * weight / weights_sum for weight in weights]
+	numbers = [(int)(share) for share in shares]
+	remainders = sorted(range(0, length), key=lambda i: shares[i] - numbers[i], reverse=True)
+	for i in remainders[:total - sum(numbers)]:
+		numbers[i] += 1
 	return numbers
 
 
 """Generates a set of numbers following a Gaussian distribution and whose sum if in the specified range.
 
-The sum of all the numbers from the set generated must be in the range specified.
-Calls the generate function until the range condition is met.
+See sample_in_range, the random number generator can be seeded for reproducibility.
 
 Args:
 	mean: The mean of the set.
 	length: The size of the set.
 	min_sum: Lower bound of the range, included.
 	max_sum: Upper bound of the range, included.
+	seed: The seed for the random number generator or None for a random seed.
 
 Returns:
 	The set of numbers as a Python array.
 """
-def generate_in_range(mean, length, min_sum, max_sum):
-	numbers = generate(mean, length)
-	total = sum(numbers)
-	while total < 50 or total > 60:
-		numbers = generate(mean, length)
-		total = sum(numbers)
-	return numbers
+def generate_in_range(mean, length, min_sum, max_sum, seed = None):
+	return sample_in_range(mean, length, min_sum, max_sum, random.Random(seed))
+
+
+"""Generates several sets of numbers following a Gaussian distribution and whose sums are in the specified range.
+
+Args:
+	mean: The mean of the sets.
+	length: The size of each set.
+	min_sum: Lower bound of the range, included.
+	max_sum: Upper bound of the range, included.
+	count: The number of sets to generate.
+	seed: The seed for the random number generator or None for a random seed.
+
+Returns:
+	The sets of numbers as a Python array of arrays.
+"""
+def generate_batch(mean, length, min_sum, max_sum, count, seed = None):
+	generator = random.Random(seed)
+	return [sample_in_range(mean, length, min_sum, max_sum, generator) for i in range(0, count)]
 
 
 if __name__ == "__main__":
@@ -2,160 +2,1108 @@
 import sys
 import os
 import re
+import functools
+import hashlib
 import json
+import mmap
+import multiprocessing
+import queue
 import subprocess
+import threading
 import time
+import packfile
 
-"""Dumps the logs from a git repository as a JSON document.
+"""The fields of a commit in the git logs, with the git log placeholder to read them.
+"""
+LOG_FIELDS = (
+	('hash', '%H'),
+	('tree', '%T'),
+	('author', '%an'),
+	('author-email', '%ae'),
+	('author-date', '%at'),
+	('committer', '%cn'),
+	('committer-email', '%ce'),
+	('committer-date', '%ct'),
+	('message', '%s')
+)
+
+
+"""A handle on a git repository.
+
+The git commands are run in the directory of the repository with an explicit environment,
+so the current working directory and os.environ are never changed and the handle can be used from several threads.
+The path is made absolute, so the handle still works if the current working directory changes.
+The objects are looked up through a long-lived git cat-file --batch-check process, started when first needed,
+instead of a new process for each object (e.g. to read HEAD after each commit).
+This process is protected by a lock.
+
+Attributes:
+	path: The absolute path to the directory of the repository.
+	batch_check: The git cat-file --batch-check process, or None if not started yet.
+	batch_check_lock: The lock of the git cat-file --batch-check process.
+"""
+class Repository:
+	def __init__(self, path):
+		self.path = os.path.abspath(path)
+		self.batch_check = None
+		self.batch_check_lock = threading.Lock()
+
+	def __enter__(self):
+		return self
+
+	# Only the path is kept when a handle is sent to another process, the git cat-file process is started again there:
+	def __getstate__(self):
+		return {'path': self.path}
+
+	def __setstate__(self, state):
+		self.__init__(state['path'])
+
+	def __exit__(self, type, value, traceback):
+		self.close()
+
+	"""Builds the environment of a git command.
+
+	Args:
+		variables: The environment variables to add, e.g. GIT_COMMITTER_NAME.
+
+	Returns:
+		A copy of the current environment, with the variables added.
+	"""
+	def environment(self, variables = {}):
+		environment = dict(os.environ)
+		environment.update(variables)
+		return environment
+
+	"""Runs a git command in the repository and waits for it.
+
+	Args:
+		arguments: The arguments of the git command (e.g. ('commit', '-q')).
+		input: The data to write on the standard input of the command, as bytes.
+		env: The environment variables to add for the command.
+		check: True to raise an exception if the command fails.
+
+	Returns:
+		The standard output of the command, as bytes.
+	"""
+	def run(self, arguments, input = None, env = {}, check = True):
+		# Without input, the standard input of the caller isn't inherited, so that no command can read it:
+		stdin = subprocess.DEVNULL if input == None else None
+		result = subprocess.run(('git',) + tuple(arguments), input=input, stdin=stdin, cwd=self.path, env=self.environment(env), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+		if check and result.returncode != 0:
+			raise Exception("git %s failed: %s" % (arguments[0], result.stderr.decode('utf-8', 'replace').strip()))
+		return result.stdout
+
+	"""Runs a git command in the repository and reads its output as a string.
+
+	Args:
+		arguments: The arguments of the git command.
+		input: The data to write on the standard input of the command, as bytes.
+		env: The environment variables to add for the command.
+
+	Returns:
+		The standard output of the command, without the trailing newline.
+	"""
+	def output(self, arguments, input = None, env = {}):
+		return self.run(arguments, input=input, env=env).decode('utf-8').strip()
+
+	"""Runs a git command in the repository, without its output, and waits for it.
+
+	Args:
+		arguments: The arguments of the git command.
+		env: The environment variables to add for the command.
+
+	Returns:
+		The exit status of the command.
+	"""
+	def call(self, arguments, env = {}):
+		return subprocess.call(('git',) + tuple(arguments), cwd=self.path, env=self.environment(env), stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
 
-The call to this function must be made from the parent directory of the directory of the repository.
-The logs are saved as a JSON document in the directory of the repository.
-This function temporarily changes the current working directory.
+	"""Starts a git command in the repository, without waiting for it.
+
+	Args:
+		arguments: The arguments of the git command.
+		env: The environment variables to add for the command.
+		options: The other options of subprocess.Popen (e.g. stdin).
+
+	Returns:
+		The process.
+	"""
+	def popen(self, arguments, env = {}, **options):
+		return subprocess.Popen(('git',) + tuple(arguments), cwd=self.path, env=self.environment(env), **options)
+
+	"""Reads the type and size of an object through git cat-file --batch-check.
+
+	The git cat-file process is started if needed.
+
+	Args:
+		name: The name of the object (a hash or any revision, e.g. HEAD).
+
+	Returns:
+		A tuple with the hash, type and size of the object, or None if it doesn't exist.
+	"""
+	def object_info(self, name):
+		with self.batch_check_lock:
+			if self.batch_check == None:
+				self.batch_check = self.popen(('cat-file', '--batch-check'), stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+			self.batch_check.stdin.write(name.encode('utf-8') + b"\n")
+			self.batch_check.stdin.flush()
+			fields = self.batch_check.stdout.readline().decode('utf-8').split()
+		if len(fields) != 3:
+			# The object is missing or its name is ambiguous:
+			return None
+		return (fields[0], fields[1], int(fields[2]))
+
+	"""Stops the git cat-file process.
+	"""
+	def close(self):
+		with self.batch_check_lock:
+			if self.batch_check != None:
+				self.batch_check.stdin.close()
+				self.batch_check.wait()
+				self.batch_check = None
+
+
+"""Checks that a new repository can be created in a directory.
+
+Args:
+	repository: The directory name for the new repository.
+
+Raises:
+	Exception: The directory already exists and isn't empty; nothing is written in it.
+"""
+def check_new_directory(repository):
+	if os.path.isdir(repository) and len(os.listdir(repository)) > 0:
+		raise Exception("%s already exists, remove it or choose another name." % (repository))
+
+
+"""Creates an empty git repository.
+
+Args:
+	path: The directory of the new repository, created if needed.
+	bare: True to create a bare repository.
+
+Returns:
+	The handle of the new repository.
+"""
+def init_repository(path, bare = False):
+	arguments = ['init', '-q']
+	if bare:
+		arguments.append('--bare')
+	Repository(os.path.dirname(os.path.abspath(path))).run(arguments + [os.path.abspath(path)])
+	return Repository(path)
+
+
+"""Reads the logs from a git repository, commit by commit.
+
+The logs are read from the output of git log -z with NUL-delimited fields, as they are produced.
+Thus, names and messages can contain any character and the commits can be used before the whole history is read.
+The commits are yielded from the oldest to the newest.
 
 Args:
 	repository: The name of the folder where the repository is.
+	revisions: The revisions to read the logs of, as given to git log.
 
 Returns:
-	The logs as a Python array.
+	A generator of commits, as Python dictionaries.
 """
-def dump_logs(repository):
-	os.chdir(repository)
+def iter_logs(repository, revisions = 'HEAD'):
+	format = '%x00'.join([placeholder for (field, placeholder) in LOG_FIELDS])
+	process = Repository(repository).popen(('log', '--reverse', '-z', '--pretty=format:' + format, revisions), stdout=subprocess.PIPE)
 
-	# Dumps the git logs in a JSON document.
-	os.system("""git log --reverse --pretty=format:'{%n  "hash": "%H",%n  "author": "%an",%n  "author-email": "%ae",%n  "author-date": %at,%n  "committer": "%cn",%n  "committer-email": "%ce",%n  "committer-date": %ct,%n  "message": "%s"%n},' $@ | perl -pe 'BEGIN{print "["}; END{print "]\n"}' | perl -pe 's/},]/}]/' > logs.json""")
+	values = []
+	buffer = b''
+	while True:
+		chunk = process.stdout.read(64 * 1024)
+		if not chunk:
+			break
+		# The last token may be incomplete, it is kept for the next chunk:
+		tokens = (buffer + chunk).split(b'\0')
+		buffer = tokens.pop()
+		for token in tokens:
+			values.append(token)
+			if len(values) == len(LOG_FIELDS):
+				yield make_log(values)
+				values = []
+	# The last commit isn't followed by a NUL character:
+	if len(values) == len(LOG_FIELDS) - 1:
+		values.append(buffer)
+		yield make_log(values)
+	process.stdout.close()
+	process.wait()
 
-	# Rewrites the escaped JSON document in a new file.
-	# Then, the original JSON document in overwritten with the new one:
-	json_data = open('logs.json')
-	json_escaped = open('logs-escaped.json', 'w')
-	for line in json_data:
-		matches = re.match(r'^  "message": "(.+)"$', line)
-		if matches:
-			# Escapes the backslashes first, the double quotes after
-			# because we need to add a backslash to escape the double quotes:
-			message = matches.group(1).replace('\\', '\\\\')
-			message = message.replace('"', '\\"')
-			line = '  "message": "%s"\n' % (message)
-		json_escaped.write(line)
-	json_data.close()
-	json_escaped.close()
-	os.system("mv logs-escaped.json logs.json")
 
-	# Reads the git logs from the JSON document.
-	json_data = open("logs.json")
-	logs = json.load(json_data)
+"""Builds a commit log from the raw values of its fields.
+
+Args:
+	values: The values of the fields from LOG_FIELDS, as bytes.
+
+Returns:
+	The commit as a Python dictionary.
+"""
+def make_log(values):
+	log = {}
+	for ((field, placeholder), value) in zip(LOG_FIELDS, values):
+		value = value.decode('utf-8', errors='replace')
+		if field.endswith('-date'):
+			value = int(value)
+		log[field] = value
+	return log
+
+
+"""Extracts the patch of a commit.
+
+Uses the binary option to be able to dump and then apply the images and other binary files.
+The first commit is dumped entirely, the others as a diff with the previous commit.
+
+Args:
+	hashes: A tuple with the hash of the previous commit (None for the first commit) and the hash of the commit.
+	repository: The handle of the repository.
+
+Returns:
+	The patch, as bytes.
+"""
+def extract_patch(hashes, repository):
+	(previous_hash, hash) = hashes
+	if previous_hash == None:
+		return repository.run(('show', '--binary', hash))
+	return repository.run(('diff', '--binary', previous_hash, hash))
+
+
+"""Loads the index of the patch archive of a repository.
+
+The index is in the git directory of the repository, next to the archive.
+It records the offsets of the patches in the archive (the patch N is between the offsets N and N + 1)
+and the number and hash of the last commit dumped.
+
+Args:
+	repository: The name of the folder where the repository is.
+
+Returns:
+	The index as a Python dictionary.
+	None if the commits were never dumped.
+"""
+def load_patch_index(repository):
+	path = os.path.join(get_git_directory(repository), 'patches.index')
+	if not os.path.isfile(path):
+		return None
+	json_data = open(path)
+	index = json.load(json_data)
 	json_data.close()
-	
-	os.chdir('..')
+	return index
 
-	return logs
 
+"""Opens the patch archive of a repository.
 
-"""Dumps the commits from a git repository as patch files.
+The archive is memory mapped, the patch N is archive[offsets[N]:offsets[N + 1]].
 
-The patch files are created into the repository directory.
-This function temporarily changes the current working directory.
+Args:
+	repository: The name of the folder where the repository is.
+
+Returns:
+	A tuple with the archive and the offsets of the patches.
+"""
+def open_patch_archive(repository):
+	offsets = load_patch_index(repository)['offsets']
+	if offsets[-1] == 0:
+		return (b'', offsets)
+	archive_file = open(os.path.join(get_git_directory(repository), 'patches.archive'), 'rb')
+	archive = mmap.mmap(archive_file.fileno(), 0, access=mmap.ACCESS_READ)
+	archive_file.close()
+	return (archive, offsets)
+
+
+"""Dumps the commits from a git repository in a patch archive.
+
+The patches are appended to the patches.archive file in the git directory of the repository, so the working tree is left untouched.
+Their offsets and the number and hash of the last commit dumped are recorded in the patches.index file, next to it.
+If the commits were already dumped for the same logs, only the patches of the new commits are appended
+and the files aren't touched if there are no new commits.
+The patches can be extracted by several processes in parallel, they are still written in order.
 
 Args:
 	repository: The name of the folder where the repository is.
 	logs: The git logs as a Python array.
+	jobs: The number of processes extracting the patches.
+"""
+def dump_commits(repository, logs, jobs = 1):
+	git_directory = get_git_directory(repository)
+	index = load_patch_index(repository)
+
+	# Finds the last commit dumped, if its number is still the same in the logs:
+	start = 0
+	offsets = [0]
+	if index != None:
+		(num_commit, hash) = index['head']
+		if num_commit < len(logs) and logs[num_commit]['hash'] == hash:
+			start = num_commit + 1
+			offsets = index['offsets'][:start + 1]
+	if start == len(logs):
+		return
+
+	tasks = []
+	for i in range(start, len(logs)):
+		if i == 0:
+			tasks.append((None, logs[i]['hash']))
+		else:
+			tasks.append((logs[i-1]['hash'], logs[i]['hash']))
+
+	pool = None
+	extract = functools.partial(extract_patch, repository=Repository(os.path.abspath(repository)))
+	patches = map(extract, tasks)
+	if jobs > 1:
+		pool = multiprocessing.Pool(jobs)
+		patches = pool.imap(extract, tasks, chunksize=16)
+
+	# Drops what may have been appended after the last commit dumped:
+	archive = open(os.path.join(git_directory, 'patches.archive'), 'ab')
+	try:
+		archive.truncate(offsets[-1])
+		num_commit = start
+		for patch in patches:
+			archive.write(patch)
+			offsets.append(offsets[-1] + len(patch))
+			num_commit += 1
+			if num_commit % 100 == 0 or num_commit == len(logs):
+				sys.stdout.write("\r%d/%d patches" % (num_commit, len(logs)))
+				sys.stdout.flush()
+		if pool != None:
+			pool.close()
+	finally:
+		archive.close()
+		if pool != None:
+			# After a failure, the workers still extracting patches are stopped:
+			pool.terminate()
+			pool.join()
+
+	json_data = open(os.path.join(git_directory, 'patches.index'), 'w')
+	json.dump({'head': [len(logs) - 1, logs[-1]['hash']], 'offsets': offsets}, json_data)
+	json_data.close()
+
+
+"""Rewrites the identities and dates of a commit.
+
+The committer and author (and their email addresses) are replaced if they are part of the contributors specified.
+The committer and author dates are shifted by the offset value.
+
+Args:
+	log: The git log of the commit.
+	your_username: Your username. Will replace the contributors specified.
+	your_email: Your email address. Will replace the email addresses of the contributors specified.
+	contributors: The contributors to replace or all to replace all of them.
+	offset: The offset (in seconds) of which the commit's dates must be shifted.
+
+Returns:
+	A tuple with the author, author email, author date, committer, committer email and committer date.
+"""
+def rewrite_commit(log, your_username, your_email, contributors, offset):
+	committer = log['committer']
+	committer_email = log['committer-email']
+	if contributors == 'all' or committer_email in contributors:
+		committer = your_username
+		committer_email = your_email
+	author = log['author']
+	author_email = log['author-email']
+	if contributors == 'all' or author_email in contributors:
+		author = your_username
+		author_email = your_email
+	committer_date = log['committer-date'] + offset
+	author_date = log['author-date'] + offset
+	return (author, author_email, author_date, committer, committer_email, committer_date)
+
+
+"""The name of the progress journal of a rebuild, in the git directory of the new repository.
+"""
+JOURNAL = 'frankenstein-journal'
+
+
+"""Builds the parameters of a rebuild, recorded in the header of its journal.
+
+A rebuild can only be resumed with the same parameters, otherwise the new repository would mix the dates
+or identities of two runs: the offset depends on the current time and the redistributed dates are random.
+The seed of the redistributed dates is recorded to draw the same dates again when resuming, and the dates are recorded as a digest.
+
+Args:
+	logs: The git logs as a Python array.
+	your_username: Your username. Will replace the contributors specified.
+	your_email: Your email address. Will replace the email addresses of the contributors specified.
+	contributors: The contributors to replace or all to replace all of them.
+	offset: The offset (in seconds) of which the commit's dates must be shifted.
+	seed: The seed of the redistributed dates, None if the dates weren't redistributed.
+
+Returns:
+	The parameters as a Python dictionary.
 """
-def dump_commits(repository, logs):
-	os.chdir(repository)
+def journal_parameters(logs, your_username, your_email, contributors, offset, seed = None):
+	digest = hashlib.sha1()
+	for log in logs:
+		digest.update(b"%d %d\n" % (log['author-date'], log['committer-date']))
+	return {
+		'offset': offset,
+		'name': your_username,
+		'email': your_email,
+		'contributors': contributors,
+		'seed': seed,
+		'dates': digest.hexdigest()
+	}
+
+
+"""Reads the parameters of a rebuild from the header of its journal.
+
+Args:
+	repository: The directory of the new repository.
+
+Returns:
+	The parameters of the rebuild (see journal_parameters),
+	None if there is no journal or if its header can't be read.
+"""
+def read_journal_parameters(repository):
+	path = os.path.join(repository, '.git', JOURNAL)
+	if not os.path.isfile(path):
+		return None
+	journal = open(path)
+	header = journal.readline()
+	journal.close()
+	try:
+		return json.loads(header)
+	except ValueError:
+		return None
+
+
+"""Reads the progress journal of a rebuild.
+
+The first line of the journal holds the parameters of the rebuild (see journal_parameters), as a JSON object.
+Each following line holds the hash of a source commit and the hash of the commit made from it,
+or failed if its patch couldn't be applied.
+
+Args:
+	repository: The directory of the new repository.
+
+Returns:
+	A tuple with the parameters of the rebuild and the entries of the journal,
+	as tuples with the source hash and the new hash (None for a failure), in order.
+	The parameters are None, and there are no entries, if there is no journal or if its header can't be read.
+"""
+def read_journal(repository):
+	entries = []
+	parameters = read_journal_parameters(repository)
+	if parameters == None:
+		return (parameters, entries)
+	journal = open(os.path.join(repository, '.git', JOURNAL))
+	# Skips the header:
+	journal.readline()
+	for line in journal:
+		fields = line.split()
+		# A line can be truncated if the rebuild was killed while writing it:
+		if len(fields) != 2 or (fields[1] != 'failed' and len(fields[1]) != 40):
+			break
+		(source_hash, new_hash) = fields
+		if new_hash == 'failed':
+			new_hash = None
+		entries.append((source_hash, new_hash))
+	journal.close()
+	return (parameters, entries)
 
-	# Uses the binary option to be able to dump and then apply the images and other binary files:
-	os.system("git show --binary %s > 0.patch" % (logs[0]['hash']))
-	for i in range(1, len(logs)):
-		result = os.system("git diff --binary %s %s > %d.patch" % (logs[i-1]['hash'], logs[i]['hash'], i))
 
-	os.chdir('..')
+"""Prepares a new repository to resume a rebuild from its journal.
+
+The new repository is created if its directory doesn't exist or is empty.
+A rebuild is only resumed if the journal exists and was written with the same parameters;
+any other existing directory is refused, so that nothing is deleted from it.
+The repository is then reset to the last good commit of the journal, which drops the changes of an interrupted commit.
+
+Args:
+	repository: The handle of the new repository.
+	logs: The git logs as a Python array.
+	parameters: The parameters of the rebuild, from journal_parameters.
+
+Returns:
+	A tuple with the number of the first commit to rebuild and the journal opened to append new entries.
+"""
+def resume_repository(repository, logs, parameters):
+	journal_path = os.path.join(repository.path, '.git', JOURNAL)
+	if not os.path.isfile(journal_path):
+		if os.path.isdir(repository.path) and len(os.listdir(repository.path)) > 0:
+			raise Exception("%s already exists and isn't an interrupted rebuild, remove it or choose another name." % (repository.path))
+		init_repository(repository.path)
+		journal = open(journal_path, 'w')
+		journal.write(json.dumps(parameters) + "\n")
+		journal.flush()
+		return (0, journal)
+
+	(previous_parameters, entries) = read_journal(repository.path)
+	if previous_parameters != parameters:
+		raise Exception("The rebuild in %s was started with other parameters (offset, identity or dates), remove it to start again." % (repository.path))
+
+	# Only the commits rebuilt in the order of the logs count, the last of them is the last good commit:
+	rebuilt = dict(entries)
+	start = 0
+	while start < len(logs) and rebuilt.get(logs[start]['hash']) != None:
+		start += 1
+	# The last commits recorded may have been lost with the objects not yet written to disk:
+	while start > 0 and repository.object_info(rebuilt[logs[start - 1]['hash']]) == None:
+		start -= 1
+
+	if start > 0:
+		last_hash = rebuilt[logs[start - 1]['hash']]
+		print("Resuming after commit %d (%s)." % (start - 1, last_hash))
+		repository.run(('reset', '-q', '--hard', last_hash))
+	else:
+		if repository.object_info('HEAD') != None:
+			# The first commit was made but not recorded:
+			repository.run(('update-ref', '-d', 'HEAD'))
+		# Drops the changes of an interrupted first commit:
+		repository.run(('read-tree', '--empty'))
+	repository.run(('clean', '-q', '-f', '-d'))
+
+	journal = open(journal_path, 'a')
+	return (start, journal)
+
+
+"""Records a commit rebuilt, or a failure, in the progress journal.
+
+The entry is flushed immediately so that it survives a crash of the rebuild.
+
+Args:
+	journal: The journal, opened to append.
+	source_hash: The hash of the source commit.
+	new_hash: The hash of the new commit, None if the patch couldn't be applied.
+"""
+def record_journal(journal, source_hash, new_hash):
+	if new_hash == None:
+		new_hash = 'failed'
+	journal.write("%s %s\n" % (source_hash, new_hash))
+	journal.flush()
+
+
+"""Rebuilds a commit in the new repository and records it in the progress journal.
+
+If the patch can't be applied, the failure is recorded and an exception is raised:
+continuing would produce commits with wrong trees.
+
+Args:
+	journal: The journal, opened to append.
+	num_commit: The number of the commit in the logs.
+	log: The commit, from the git logs.
+	make_commit: The function applying the patch and committing it, which returns the hash of the new commit.
+
+Returns:
+	The hash of the new commit.
+"""
+def rebuild_commit(journal, num_commit, log, make_commit):
+	try:
+		new_hash = make_commit()
+	except Exception as error:
+		record_journal(journal, log['hash'], None)
+		raise Exception("Failed to rebuild commit %d (%s): %s" % (num_commit, log['hash'], error))
+	record_journal(journal, log['hash'], new_hash)
+	return new_hash
 
 
 """Rebuild a git repository from patches and with some modifications.
 
-Uses the patch files and the git logs to rebuild a repository.
+Uses the patch archive and the git logs to rebuild a repository.
 A commit is made between each patch applied.
 The contributors can be replaced with the credentials specified.
 All the committer and author dates will be shift by the offset value.
 
-This function temporarily changes the current working directory.
+The progress is recorded in a journal (see read_journal) in the new repository.
+If the new repository is an interrupted rebuild with the same parameters, the rebuild resumes after its last good commit.
+Any other existing directory is refused.
+The rebuild stops at the first patch which can't be applied.
+
 It only reproduces the commit history and doesn't push it.
 The user will need to add a remote repository (git remote add) before pushing.
 
 Args:
-	dump_folder: The directory containing the pach files and the JSON document.
+	dump_folder: The directory containing the patch archive and the JSON document.
 	logs: The git logs as a Python array.
 	repository: The directory name for the new repository.
 	your_username: Your username. Will replace the contributors specified.
 	your_email: Your email address. Will replace the email addresses of the contributors specified.
 	contributors: The contributors to replace or all to replace all of them.
 	offset: The offset (in seconds) of which the commit's dates must be shifted.
+	seed: The seed of the redistributed dates, recorded in the journal (None if the dates weren't redistributed).
 """
-def rebuild_repository(dump_folder, logs, repository, your_username, your_email, contributors = [], offset = 0):
-	os.system("mkdir %s" % (repository))
-	os.chdir(repository)
+def rebuild_repository(dump_folder, logs, repository, your_username, your_email, contributors = [], offset = 0, seed = None):
+	(archive, offsets) = open_patch_archive(dump_folder)
+	handle = Repository(repository)
+	(start, journal) = resume_repository(handle, logs, journal_parameters(logs, your_username, your_email, contributors, offset, seed))
+	# The commits which would be in the future aren't made:
+	count = count_past_commits(logs, offset)
+	try:
+		for i in range(start, count):
+			log = logs[i]
+			commit = rewrite_commit(log, your_username, your_email, contributors, offset)
+
+			patch = archive[offsets[i]:offsets[i + 1]]
+			rebuild_commit(journal, i, log, lambda: commit_patch(handle, patch, *commit, log['message']))
+	finally:
+		journal.close()
+		handle.close()
+	if count < len(logs):
+		print("Reached current date.")
+
+
+"""Applies a patch in a working tree and commits it.
+
+The command outputs are not displayed.
+This function doesn't change the current working directory nor the environment, so it can be called from several threads.
+
+Args:
+	repository: The handle of the new repository.
+	patch: The patch to apply, as bytes.
+	author: The author name.
+	author_email: The author email address.
+	author_date: The author date, as a timestamp.
+	committer: The committer name.
+	committer_email: The committer email address.
+	committer_date: The committer date, as a timestamp.
+	message: The commit message.
 
-	os.system("git init")
+Returns:
+	The hash of the new commit.
+
+Raises:
+	Exception: The patch couldn't be applied or the commit failed.
+"""
+def commit_patch(repository, patch, author, author_email, author_date, committer, committer_email, committer_date, message):
+	repository.run(('apply', '--whitespace=nowarn'), input=patch)
+	repository.run(('add', '--all', '.'))
+
+	# The values for the committer can only be changed through the environnement variables:
+	environment = {
+		"GIT_COMMITTER_NAME": committer,
+		"GIT_COMMITTER_EMAIL": committer_email,
+		"GIT_COMMITTER_DATE": str(committer_date)
+	}
+
+	# allow-empty option for commits containing nothing (merge commits for example),
+	# allow-empty-message for commits without a subject.
+	repository.run(('commit', '--allow-empty', '--allow-empty-message', '-q', '-m', message, '--author=%s <%s>' % (author, author_email), '--date=%d' % (author_date)), env=environment)
+	return repository.object_info('HEAD')[0]
+
+
+"""Applies a patch to an index and commits the resulting tree.
+
+The working tree is neither read nor changed, so the cost of a commit only depends on the size of its patch.
+
+Args:
+	repository: The handle of the new repository.
+	index_file: The absolute path to the index, which must hold the tree of the parent commit.
+	patch: The patch to apply, as bytes.
+	parent: The hash of the parent commit or None for the first commit.
+	author: The author name.
+	author_email: The author email address.
+	author_date: The author date, as a timestamp.
+	committer: The committer name.
+	committer_email: The committer email address.
+	committer_date: The committer date, as a timestamp.
+	message: The commit message.
+
+Returns:
+	The hash of the new commit.
+"""
+def commit_patch_index(repository, index_file, patch, parent, author, author_email, author_date, committer, committer_email, committer_date, message):
+	environment = {"GIT_INDEX_FILE": index_file}
+	repository.run(('apply', '--cached', '--whitespace=nowarn'), input=patch, env=environment)
+	tree = repository.output(('write-tree',), env=environment)
+
+	environment = {
+		"GIT_AUTHOR_NAME": author,
+		"GIT_AUTHOR_EMAIL": author_email,
+		"GIT_AUTHOR_DATE": str(author_date),
+		"GIT_COMMITTER_NAME": committer,
+		"GIT_COMMITTER_EMAIL": committer_email,
+		"GIT_COMMITTER_DATE": str(committer_date)
+	}
+	# The message is given on the standard input: with an empty -m, git commit-tree would read it from the inherited standard input.
+	arguments = ['commit-tree', tree, '-F', '-']
+	if parent != None:
+		arguments += ['-p', parent]
+	return repository.output(arguments, input=message.encode('utf-8'), env=environment)
+
+
+"""Rebuild a git repository from patches applied to an index only.
+
+Produces the same history as rebuild_repository, from the same patch archive,
+but the patches are applied to a private index with git apply --cached and committed with git write-tree and git commit-tree.
+Thus, the working tree isn't checked at each commit (as git add --all does), it is only checked out once at the end.
+As with rebuild_repository, the progress is recorded in a journal and an interrupted rebuild resumes after its last good commit.
+
+It only reproduces the commit history and doesn't push it.
+The user will need to add a remote repository (git remote add) before pushing.
+
+Args:
+	dump_folder: The directory containing the patch archive and the JSON document.
+	logs: The git logs as a Python array.
+	repository: The directory name for the new repository.
+	your_username: Your username. Will replace the contributors specified.
+	your_email: Your email address. Will replace the email addresses of the contributors specified.
+	contributors: The contributors to replace or all to replace all of them.
+	offset: The offset (in seconds) of which the commit's dates must be shifted.
+	seed: The seed of the redistributed dates, recorded in the journal (None if the dates weren't redistributed).
+"""
+def index_repository(dump_folder, logs, repository, your_username, your_email, contributors = [], offset = 0, seed = None):
+	(archive, offsets) = open_patch_archive(dump_folder)
+	handle = Repository(repository)
+	(start, journal) = resume_repository(handle, logs, journal_parameters(logs, your_username, your_email, contributors, offset, seed))
+	index_file = os.path.join(os.path.abspath(repository), '.git', 'frankenstein-index')
+	parent = None
+	head = handle.object_info('HEAD')
+	if head != None:
+		parent = head[0]
+
+	# The private index starts from the tree of the last commit:
+	if parent != None:
+		handle.run(('read-tree', parent), env={"GIT_INDEX_FILE": index_file})
+	else:
+		handle.run(('read-tree', '--empty'), env={"GIT_INDEX_FILE": index_file})
+
+	# The commits which would be in the future aren't made:
+	count = count_past_commits(logs, offset)
+	try:
+		for i in range(start, count):
+			log = logs[i]
+			commit = rewrite_commit(log, your_username, your_email, contributors, offset)
+
+			patch = archive[offsets[i]:offsets[i + 1]]
+			parent = rebuild_commit(journal, i, log, lambda: commit_patch_index(handle, index_file, patch, parent, *commit, log['message']))
+	finally:
+		journal.close()
+		# Even after a failure, the branch points to the last good commit:
+		if parent != None:
+			handle.run(('update-ref', 'HEAD', parent))
+			# Checks out the last commit in the working tree, once:
+			handle.run(('reset', '-q', '--hard'))
+		handle.close()
+		os.remove(index_file)
+	if count < len(logs):
+		print("Reached current date.")
+
+
+"""Counts the commits which remain in the past once shifted.
+
+Args:
+	logs: The git logs as a Python array.
+	offset: The offset (in seconds) of which the commit's dates must be shifted.
+
+Returns:
+	The number of commits before the first one which would be in the future.
+"""
+def count_past_commits(logs, offset):
+	current_time = (int)(time.time())
 	for i in range(0, len(logs)):
+		if logs[i]['committer-date'] + offset > current_time or logs[i]['author-date'] + offset > current_time:
+			return i
+	return len(logs)
+
+
+"""Rebuild a git repository while the patches are extracted.
+
+Produces the same history as rebuild_repository, but the patches aren't dumped first:
+a thread extracts them from the original repository while the commits are made with the previous ones.
+The patches waiting to be applied are kept in a bounded queue, so the memory used doesn't depend on the size of the history.
+If a patch can't be extracted, the commits made before it are kept and the extraction error is raised.
+As with rebuild_repository, the progress is recorded in a journal and an interrupted rebuild resumes after its last good commit.
+
+It only reproduces the commit history and doesn't push it.
+The user will need to add a remote repository (git remote add) before pushing.
+
+Args:
+	dump_folder: The directory containing the original repository.
+	logs: The git logs as a Python array.
+	repository: The directory name for the new repository.
+	your_username: Your username. Will replace the contributors specified.
+	your_email: Your email address. Will replace the email addresses of the contributors specified.
+	contributors: The contributors to replace or all to replace all of them.
+	offset: The offset (in seconds) of which the commit's dates must be shifted.
+	queue_size: The maximum number of patches waiting to be applied.
+	seed: The seed of the redistributed dates, recorded in the journal (None if the dates weren't redistributed).
+"""
+def pipeline_repository(dump_folder, logs, repository, your_username, your_email, contributors = [], offset = 0, queue_size = 64, seed = None):
+	source = Repository(os.path.abspath(dump_folder))
+	handle = Repository(repository)
+	(start, journal) = resume_repository(handle, logs, journal_parameters(logs, your_username, your_email, contributors, offset, seed))
+
+	count = count_past_commits(logs, offset)
+	patches = queue.Queue(queue_size)
+	stopped = threading.Event()
+	# The exception of the extractor, raised again once it is joined:
+	errors = []
+	def extract_patches():
+		try:
+			for i in range(start, count):
+				if stopped.is_set():
+					break
+				previous_hash = None
+				if i > 0:
+					previous_hash = logs[i-1]['hash']
+				patches.put(extract_patch((previous_hash, logs[i]['hash']), source))
+		except Exception as error:
+			errors.append(error)
+		finally:
+			# Signals the end of the patches, even if the extraction failed:
+			patches.put(None)
+	extractor = threading.Thread(target=extract_patches)
+	extractor.start()
+
+	try:
+		for i in range(start, count):
+			patch = patches.get()
+			if patch == None:
+				break
+			commit = rewrite_commit(logs[i], your_username, your_email, contributors, offset)
+			rebuild_commit(journal, i, logs[i], lambda: commit_patch(handle, patch, *commit, logs[i]['message']))
+	except:
+		# Unblocks the extractor, which stops after its current patch:
+		stopped.set()
+		while patches.get() != None:
+			pass
+		raise
+	finally:
+		extractor.join()
+		journal.close()
+		handle.close()
+		source.close()
+	if len(errors) > 0:
+		raise Exception("Failed to extract the patches: %s" % (errors[0]))
+	if count < len(logs):
+		print("Reached current date.")
+
+
+"""Writes a commit to a git fast-import stream.
+
+The commit is added on top of the reference, after the previous commit written to the stream for that reference.
+
+Args:
+	stream: The standard input of the git fast-import process.
+	reference: The reference the commit is made on (e.g. refs/heads/master).
+	author: The author name.
+	author_email: The author email address.
+	author_date: The author date, as a timestamp.
+	committer: The committer name.
+	committer_email: The committer email address.
+	committer_date: The committer date, as a timestamp.
+	message: The commit message.
+	tree: The hash of the tree for the commit or None to keep the tree of the previous commit.
+	parent: The hash of the parent commit, only needed for the first commit on a reference which already exists.
+	files: The files added or modified by the commit, as tuples with the path and the content (as bytes).
+"""
+def write_fast_import_commit(stream, reference, author, author_email, author_date, committer, committer_email, committer_date, message, tree = None, parent = None, files = []):
+	message = message.encode('utf-8')
+	stream.write(("commit %s\n" % (reference)).encode('utf-8'))
+	stream.write(("author %s <%s> %d +0000\n" % (author, author_email, author_date)).encode('utf-8'))
+	stream.write(("committer %s <%s> %d +0000\n" % (committer, committer_email, committer_date)).encode('utf-8'))
+	stream.write(b"data %d\n" % (len(message)))
+	stream.write(message + b"\n")
+	if parent != None:
+		stream.write(("from %s\n" % (parent)).encode('utf-8'))
+	if tree != None:
+		# An empty path designates the root of the tree.
+		stream.write(b'M 040000 ' + tree.encode('utf-8') + b' ""\n')
+	for (path, content) in files:
+		stream.write(("M 100644 inline %s\ndata %d\n" % (path, len(content))).encode('utf-8'))
+		stream.write(content + b"\n")
+	stream.write(b"\n")
+
+
+"""Imports commits reusing the trees of the original commits with git fast-import.
+
+The trees of the original commits must be reachable from the new repository.
+
+Args:
+	repository: The handle of the new repository.
+	logs: The git logs as a Python array.
+	reference: The reference the commits are made on (e.g. refs/heads/master).
+	your_username: Your username. Will replace the contributors specified.
+	your_email: Your email address. Will replace the email addresses of the contributors specified.
+	contributors: The contributors to replace or all to replace all of them.
+	offset: The offset (in seconds) of which the commit's dates must be shifted.
+
+Raises:
+	Exception: git fast-import failed, e.g. because a tree is missing.
+"""
+def fast_import_commits(repository, logs, reference, your_username, your_email, contributors, offset):
+	process = repository.popen(('fast-import', '--quiet'), stdin=subprocess.PIPE)
+	# The commits which would be in the future aren't made:
+	count = count_past_commits(logs, offset)
+	for i in range(0, count):
 		log = logs[i]
-		
-		# Changes the committer and author (and their email addresses) and the dates if needed:
-		committer = log['committer']
-		committer_email = log['committer-email']
-		if contributors == 'all' or committer_email in contributors:
-			committer = your_username
-			committer_email = your_email
-		author = log['author']
-		author_email = log['author-email']
-		if contributors == 'all' or author_email in contributors:
-			author = your_username
-			author_email = your_email
-		committer_date = log['committer-date'] + offset
-		author_date = log['author-date'] + offset
-
-		# Checks that the current dates hasn't been reached (we don't want to make commits in the future):
-		current_time = (int)(time.time())
-		if committer_date > current_time or author_date > current_time:
-			print("Reached current date.")
-			break
+		(author, author_email, author_date, committer, committer_email, committer_date) = rewrite_commit(log, your_username, your_email, contributors, offset)
+		write_fast_import_commit(process.stdin, reference, author, author_email, author_date, committer, committer_email, committer_date, log['message'], log['tree'])
+	process.stdin.close()
+	if process.wait() != 0:
+		raise Exception("git fast-import failed with status %d." % (process.returncode))
+	if count < len(logs):
+		print("Reached current date.")
 
-		# Apply the patch without displaying the command output.
-		os.system("git apply --whitespace=nowarn ../%s/%d.patch 2> /dev/null " % (dump_folder, i))
-		os.system("git add --all .")
 
-		# The values for the committer can only be changed through the environnement variables:
-		os.environ["GIT_COMMITTER_NAME"] = committer
-		os.environ["GIT_COMMITTER_EMAIL"] = committer_email
-		os.environ["GIT_COMMITTER_DATE"] = str(committer_date)
+"""Rebuild a git repository with a single git fast-import stream.
 
-		# Need to escape the double quotes for the commit message.
-		message = log['message'].replace('"', '\\"')
-		
-		# Quiet mode for the commits, only the errors are shown.
-		# allow-empty option for commits containing nothing (merge commits for example).
-		return_code = os.system("""git commit --allow-empty -q -m "%s" --author="%s <%s>" --date=%d""" % (message, author, author_email, author_date))
-		
-	os.chdir('..')
+Produces the same history as rebuild_repository, but without patches:
+the objects of the original repository are fetched once
+and each new commit reuses the tree of the original commit.
+All the commits are written by a single git fast-import process.
+The new repository can't be created in an existing directory which isn't empty.
+
+It only reproduces the commit history and doesn't push it.
+The user will need to add a remote repository (git remote add) before pushing.
+
+Args:
+	dump_folder: The directory containing the original repository.
+	logs: The git logs as a Python array.
+	repository: The directory name for the new repository.
+	your_username: Your username. Will replace the contributors specified.
+	your_email: Your email address. Will replace the email addresses of the contributors specified.
+	contributors: The contributors to replace or all to replace all of them.
+	offset: The offset (in seconds) of which the commit's dates must be shifted.
+"""
+def fast_import_repository(dump_folder, logs, repository, your_username, your_email, contributors = [], offset = 0):
+	check_new_directory(repository)
+	new_repository = init_repository(repository)
+	# Copies the trees and blobs from the original repository:
+	new_repository.run(('fetch', '-q', os.path.abspath(dump_folder), 'HEAD'))
+	reference = new_repository.output(('symbolic-ref', 'HEAD'))
+
+	fast_import_commits(new_repository, logs, reference, your_username, your_email, contributors, offset)
+
+	# Checks out the last commit in the working tree:
+	new_repository.run(('reset', '-q', '--hard'))
+	os.remove(os.path.join(repository, '.git', 'FETCH_HEAD'))
+
+
+"""Shares the objects of a repository with another one through git alternates.
+
+Args:
+	dump_folder: The directory containing the repository whose objects are shared.
+	git_directory: The git directory of the repository which borrows the objects.
+"""
+def share_objects(dump_folder, git_directory):
+	objects = os.path.join(get_git_directory(dump_folder), 'objects')
+	alternates = open(os.path.join(git_directory, 'objects', 'info', 'alternates'), 'w')
+	alternates.write(objects + "\n")
+	alternates.close()
+
+
+"""Rebuild a git repository sharing the objects of the original repository.
+
+The new repository is a bare repository which borrows the trees and blobs of the original repository through git alternates.
+Only the new commit objects are written, no patches and no working tree are produced.
+The original repository must therefore be kept as long as the new repository is used (or until a git repack -a).
+The new repository can't be created in an existing directory which isn't empty.
+
+It only reproduces the commit history and doesn't push it.
+The user will need to add a remote repository (git remote add) before pushing.
+
+Args:
+	dump_folder: The directory containing the original repository.
+	logs: The git logs as a Python array.
+	repository: The directory name for the new repository.
+	your_username: Your username. Will replace the contributors specified.
+	your_email: Your email address. Will replace the email addresses of the contributors specified.
+	contributors: The contributors to replace or all to replace all of them.
+	offset: The offset (in seconds) of which the commit's dates must be shifted.
+"""
+def share_repository(dump_folder, logs, repository, your_username, your_email, contributors = [], offset = 0):
+	check_new_directory(repository)
+	new_repository = init_repository(repository, bare=True)
+	share_objects(dump_folder, repository)
+
+	reference = new_repository.output(('symbolic-ref', 'HEAD'))
+	fast_import_commits(new_repository, logs, reference, your_username, your_email, contributors, offset)
+
+
+"""Rebuild a git repository by writing a packfile of the new commits, without any git process.
+
+Like share_repository, the new repository is a bare repository which borrows the trees and blobs of the original repository.
+The new commit objects are written by packfile.PackWriter, so no process is created.
+
+It only reproduces the commit history and doesn't push it.
+The user will need to add a remote repository (git remote add) before pushing.
+
+Args:
+	dump_folder: The directory containing the original repository.
+	logs: The git logs as a Python array.
+	repository: The directory name for the new repository.
+	your_username: Your username. Will replace the contributors specified.
+	your_email: Your email address. Will replace the email addresses of the contributors specified.
+	contributors: The contributors to replace or all to replace all of them.
+	offset: The offset (in seconds) of which the commit's dates must be shifted.
+"""
+def pack_repository(dump_folder, logs, repository, your_username, your_email, contributors = [], offset = 0):
+	packfile.init_repository(repository)
+	share_objects(dump_folder, repository)
+	(reference, parent) = packfile.resolve_reference(repository, 'HEAD')
+
+	writer = packfile.PackWriter(repository)
+	# The commits which would be in the future aren't made:
+	count = count_past_commits(logs, offset)
+	for i in range(0, count):
+		log = logs[i]
+		(author, author_email, author_date, committer, committer_email, committer_date) = rewrite_commit(log, your_username, your_email, contributors, offset)
+		parents = []
+		if parent != None:
+			parents.append(parent)
+		commit = packfile.make_commit(log['tree'], parents, author, author_email, author_date, committer, committer_email, committer_date, log['message'])
+		parent = writer.add('commit', commit)
+	writer.close()
+
+	if parent != None:
+		packfile.update_reference(repository, reference, parent)
+	if count < len(logs):
+		print("Reached current date.")
+
+
+"""Gets the git directory of a repository.
+
+Args:
+	repository: The name of the folder where the repository is.
+
+Returns:
+	The absolute path to the git directory (the .git folder or the repository folder itself for bare repositories).
+"""
+def get_git_directory(repository):
+	return Repository(repository).output(('rev-parse', '--absolute-git-dir'))
+
+
+"""Gets the hash of the current commit of a repository.
+
+Args:
+	repository: The name of the folder where the repository is.
+
+Returns:
+	The hash of HEAD.
+"""
+def get_head(repository):
+	return Repository(repository).output(('rev-parse', 'HEAD'))
+
+
+"""Checks if a commit is an ancestor of another one.
+
+Args:
+	repository: The name of the folder where the repository is.
+	ancestor: The hash of the potential ancestor.
+	descendant: The hash of the potential descendant.
+
+Returns:
+	True if ancestor is an ancestor of descendant.
+"""
+def is_ancestor(repository, ancestor, descendant):
+	return Repository(repository).call(('merge-base', '--is-ancestor', ancestor, descendant)) == 0
 
 
 """Gets the email addresses of the contributors of a repository.
 
-The following git command is used: git log --format='%ae' | sort -u.
-This function temporarily changes the current working directory.
+The addresses are read with git log --format='%ae', then sorted and deduplicated.
 
 Args:
 	repository: The name of the folder where the repository is.
 
 Returns:
-	The list of contributors' email addresses.
+	The sorted list of contributors' email addresses.
 """
 def get_contributors(repository):
-	os.chdir(repository)
-	process1 = subprocess.Popen(('git', 'log', '--format=%ae'), stdout=subprocess.PIPE)
-	process2 = subprocess.Popen(('sort', '-u'), stdin=process1.stdout, stdout=subprocess.PIPE)
-	contributors = process2.stdout.read().decode('utf-8').split("\n")
-	os.chdir('..')
-	return contributors
+	return sorted(set(Repository(repository).output(('log', '--format=%ae')).split("\n")))
 
 
 if __name__ == "__main__":
@@ -169,25 +1117,103 @@ if __name__ == "__main__":
 	contributors = get_contributors(repository)
 	print(contributors)
 
-	logs = dump_logs(repository)
+	logs = list(iter_logs(repository))
 	dump_commits(repository, logs)
 	rebuild_repository(repository, logs, new_repository, '', '', [], 0)
 
 
+"""Gets the folder a repository is cloned to.
+
+The folder is named after the repository, with the .git extension for a bare or partial clone.
+
+Args:
+	url: The URL to the git repository (HTTP, HTTPS or file) or the path to a local repository.
+	bare: True for a bare clone.
+	partial: True for a partial clone.
+
+Returns:
+	The folder of the clone, in the current directory.
+"""
+def get_clone_directory(url, bare = False, partial = False):
+	matches = re.match(r'(https?|file):\/\/.*\/([^\/]+?)(\.git)?\/?$', url)
+	if matches:
+		repository = matches.group(2)
+	elif os.path.isdir(url):
+		repository = re.sub(r'\.git$', '', os.path.basename(os.path.abspath(url)))
+	else:
+		raise Exception("You need to provide a HTTP(S) or file link or the path to a repository.")
+	if bare or partial:
+		repository += '.git'
+	return repository
+
+
 """Clones a repository.
 
+The repository can be cloned as a bare repository, without working tree.
+For a partial clone, the blobs are not downloaded (only the commits and trees are),
+they can be fetched later with fetch_missing_objects.
+A partial clone is always bare, since a checkout would download the blobs.
+If the repository was already cloned, the new commits are fetched into the existing clone instead.
+
 Args:
-	url: The URL to the git repository (need to be HTTP or HTTPS).
+	url: The URL to the git repository (HTTP, HTTPS or file) or the path to a local repository.
+	bare: True to clone a bare repository.
+	partial: True to clone a partial repository, without the blobs.
 
 Returns:
 	The folder where the repository was downloaded.
 """
-def clone_repository(url):
-	os.system("git clone %s" % url)
-	print()
+def clone_repository(url, bare = False, partial = False):
+	repository = get_clone_directory(url, bare, partial)
+	# The filters are ignored for local clones, the file protocol must be used instead:
+	if partial and os.path.isdir(url):
+		url = 'file://' + os.path.abspath(url)
 
-	matches = re.match(r'https?:\/\/.+\/([^\/]+)(\.git)?$', url)
-	if not matches:
-		raise Exception("You need to provide a HTTP(S) link.")
-	repository = matches.group(1)
+	arguments = ['clone']
+	if bare or partial:
+		arguments.append('--bare')
+	if partial:
+		arguments.append('--filter=blob:none')
+	if os.path.isdir(repository):
+		update_clone(repository, bare or partial)
+		return repository
+	if Repository(os.getcwd()).popen(arguments + [url, repository]).wait() != 0:
+		raise Exception("Failed to clone %s." % (url))
+	print()
 	return repository
+
+
+"""Updates a clone to the current commits of its origin repository.
+
+A bare clone has no remote-tracking branches, so its branches are fetched directly.
+Otherwise, the working tree is reset to the HEAD of the origin repository.
+
+Args:
+	repository: The folder where the repository was cloned.
+	bare: True if the clone is a bare repository.
+"""
+def update_clone(repository, bare):
+	print("Fetching into the existing clone %s..." % (repository))
+	handle = Repository(repository)
+	if bare:
+		handle.run(('fetch', '-q', '--force', 'origin', 'refs/heads/*:refs/heads/*'))
+	else:
+		handle.run(('fetch', '-q', 'origin'))
+		handle.run(('reset', '-q', '--hard', 'origin/HEAD'))
+
+
+"""Fetches the objects left out by a partial clone.
+
+Does nothing if the repository isn't a partial clone.
+Otherwise, the filter is removed and all the objects of the origin repository are fetched again at once,
+instead of one by one the first time they are used.
+
+Args:
+	repository: The name of the folder where the repository is.
+"""
+def fetch_missing_objects(repository):
+	handle = Repository(repository)
+	if handle.call(('config', 'remote.origin.partialclonefilter')) != 0:
+		return
+	handle.run(('config', '--unset', 'remote.origin.partialclonefilter'))
+	handle.run(('fetch', '-q', '--refetch', 'origin'))
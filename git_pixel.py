@@ -1,9 +1,27 @@
 #!/usr/bin/env python3
 import random
 import datetime
+import heapq
+import itertools
+import json
 import sys
 import time
 import os
+import subprocess
+import tempfile
+import git
+import history
+import packfile
+import command_line
+
+"""The number of commits per pixel when the existing activity of the user isn't known.
+"""
+DEFAULT_COMMITS = 40
+
+"""The number of color levels of the contribution graph, without the level for no contribution.
+"""
+LEVELS = 4
+
 
 """Error raised when character is not defined.
 
@@ -32,13 +50,15 @@ The pixels are represented by indexes in the contribution graph:
 6 13 20 27 34
 Only the five first lines are used such that if the drawing takes two days to appear, it will still be valid.
 Otherwise, a pixel at the bottom of the graph would go to the top of the next column.
+A pixel can also be given with a shade, as a tuple (index, shade), from 1 (lightest) to 4 (darkest).
+The pixels given as indexes only are drawn with the darkest shade.
 
 Args:
 	character: The character to encode.
 
 Returns:
 	The encoding for the character as a tuple containing:
-	- a list of indexes for the positions of each pixel of the character;
+	- a list of indexes (or tuples with the index and shade) for the positions of each pixel of the character;
 	- the width of the character including the free column after it.
 """
 def get_character_encoding(character):
@@ -82,26 +102,56 @@ Args:
 
 Returns:
 	The encoding for the string of characters.
-	A list of indexes for the positions of each pixel.
+	A list of indexes (or tuples with the index and shade) for the positions of each pixel.
 """
 def compute_string_encoding(string):
 	string_encoding = []
 	offset = 0
 	for character in string:
 		character_encoding = get_character_encoding(character)
-		for index in character_encoding[0]:
-			string_encoding.append(offset + index)
+		for pixel in character_encoding[0]:
+			(index, shade) = get_pixel_shade(pixel)
+			if shade == LEVELS:
+				string_encoding.append(offset + index)
+			else:
+				string_encoding.append((offset + index, shade))
 		offset += character_encoding[1] * 7
 	return string_encoding
 
 
+"""Gets the index and shade of a pixel.
+
+Args:
+	pixel: The pixel, as an index or a tuple with the index and shade.
+
+Returns:
+	A tuple with the index and the shade of the pixel.
+"""
+def get_pixel_shade(pixel):
+	if isinstance(pixel, tuple):
+		return pixel
+	return (pixel, LEVELS)
+
+
+"""Computes the shades of the pixels of an encoded string.
+
+Args:
+	string_encoding: The encoded string, as returned by compute_string_encoding.
+
+Returns:
+	The shade of each pixel, in the order of the dates returned by compute_dates.
+"""
+def compute_shades(string_encoding):
+	return [get_pixel_shade(pixel)[1] for pixel in string_encoding]
+
+
 """Computes the dates from an encoded string.
 
 Each pixel from the string correspond to a date in the GitHub contribution graph.
 
 Args:
 	start_date: The date where the drawing should start.
-	string_encoding: The encoded string as a list of indexes for the positions of each pixel.
+	string_encoding: The encoded string as a list of indexes (or tuples with the index and shade) for the positions of each pixel.
 
 Returns:
 	A list of dates where pixels should be drawn.
@@ -109,49 +159,357 @@ Returns:
 def compute_dates(start_date, string_encoding):
 	dates = []
 	time_in_day = 5 * 3600 + random.randint(0, 60)
-	for index in string_encoding:
+	for pixel in string_encoding:
+		index = get_pixel_shade(pixel)[0]
 		timestamp = start_date + index * 24 * 3600 + time_in_day
 		time_in_day += 60
 		dates.append(timestamp)
 	return dates
 
 
+"""Reads the number of commits of a user per day in a local repository.
+
+The commits of all the branches are counted, on the day of their author date (in local time).
+
+Args:
+	repository: The name of the directory where the repository is.
+	email: The email of the user.
+
+Returns:
+	The number of commits per day, as a dictionary with dates as keys.
+"""
+def read_existing_counts(repository, email):
+	process = git.Repository(repository).popen(('log', '--all', '--fixed-strings', '--author=<%s>' % (email), '--format=%at'), stdout=subprocess.PIPE)
+	counts = {}
+	for line in process.stdout:
+		day = datetime.date.fromtimestamp(int(line))
+		counts[day] = counts.get(day, 0) + 1
+	process.wait()
+	return counts
+
+
+"""Loads the number of commits of a user per day from a daily commit histogram.
+
+The histogram is the histogram.json document saved by frankenstein.py in the git directory, its days are UTC days.
+
+Args:
+	path: The path to the histogram.
+	email: The email of the user.
+
+Returns:
+	The number of commits per day, as a dictionary with dates as keys.
+"""
+def load_existing_counts(path, email):
+	json_data = open(path)
+	histogram = json.load(json_data)
+	json_data.close()
+	counts = {}
+	epoch = datetime.date(1970, 1, 1)
+	for (day, count) in history.get_daily_counts(histogram, email).items():
+		counts[epoch + datetime.timedelta(days=day)] = count
+	return counts
+
+
+"""Computes the number of commits needed for each pixel.
+
+The levels of the contribution graph are relative to the busiest day of the year:
+a day with c contributions is modelled with the level ceil(4 * c / maximum).
+Thus, the darkest shade only needs as many contributions as the busiest day (the existing ones included)
+and at least 4 contributions are needed on the busiest day to draw the lighter shades.
+The busiest day is searched in the year before the last pixel.
+
+Args:
+	days: The dates of the pixels, as timestamps.
+	shades: The shade of each pixel, from 1 to 4, or None to draw all of them with the darkest shade.
+	existing: The number of existing contributions per day, as a dictionary with dates as keys.
+
+Returns:
+	The number of commits to make on the day of each pixel.
+"""
+def plan_commits(days, shades = None, existing = {}):
+	days = [datetime.date.fromtimestamp(day) for day in days]
+	if shades == None:
+		shades = [LEVELS] * len(days)
+	if len(days) == 0:
+		return []
+
+	last_day = max(days)
+	first_day = last_day - datetime.timedelta(days=365)
+	maximum = max([count for (day, count) in existing.items() if first_day <= day <= last_day] + [1])
+	if min(shades) < LEVELS:
+		maximum = max(maximum, LEVELS)
+
+	commits = []
+	for (day, shade) in zip(days, shades):
+		# The smallest number of contributions with the level of the shade:
+		target = (shade - 1) * maximum // LEVELS + 1
+		commits.append(max(0, target - existing.get(day, 0)))
+	return commits
+
+
+"""Pairs the days of the pixels with their number of commits.
+
+Args:
+	days: The dates of the days where the pixels should be, as timestamps.
+	commits: The number of commits for every pixel, or a list with the number of commits of each pixel.
+
+Returns:
+	An iterator of tuples with the date of the day and the number of commits.
+"""
+def iter_pixel_commits(days, commits):
+	if isinstance(commits, int):
+		commits = itertools.repeat(commits)
+	return zip(days, commits)
+
+
 """Creates a git repository.
 
 Creates the folder and git init it.
-This function temporarily changes the current working directory to perform the git init.
 
 Args:
 	name: The name for the new repository (name of the directory).
 """
 def create_repository(name):
-	os.system("mkdir %s" % (name))
-	os.chdir(name)
-	os.system("git init -q")
-	os.chdir("..")
+	git.init_repository(name)
 
 
 """Draws pixels in the activity grapĥ.
 
-Just makes 20 empty commits on the days specified.
-This function temporarily changes the current working directory.
+Just makes empty commits on the days specified (40 per day by default).
 
 Args:
 	repository: The name of the directory where the repository is.
 	username: The name to commit under (author AND committer).
 	email: The email to commit under (author AND committer).
 	days: The dates of the days where the pixels should be, as timestamps.
+	commits: The number of commits for every pixel, or a list with the number of commits of each pixel (see plan_commits).
+"""
+def draw_pixels(repository, username, email, days, commits = DEFAULT_COMMITS):
+	handle = git.Repository(repository)
+	for (day, number) in iter_pixel_commits(days, commits):
+		environment = {"GIT_COMMITTER_NAME": username, "GIT_COMMITTER_EMAIL": email, "GIT_COMMITTER_DATE": str(day)}
+		for i in range(0, number):
+			handle.run(('commit', '--allow-empty', '-q', '-m', "Update README", '--author=%s <%s>' % (username, email), '--date=%d' % (day)), env=environment)
+
+
+"""Draws pixels in the activity graph with a single git fast-import stream.
+
+Makes the same empty commits as draw_pixels, on top of the current branch,
+but all of them are written by one git fast-import process.
+
+Args:
+	repository: The name of the directory where the repository is.
+	username: The name to commit under (author AND committer).
+	email: The email to commit under (author AND committer).
+	days: The dates of the days where the pixels should be, as timestamps.
+	commits: The number of commits for every pixel, or a list with the number of commits of each pixel (see plan_commits).
+"""
+def draw_pixels_batch(repository, username, email, days, commits = DEFAULT_COMMITS):
+	handle = git.Repository(repository)
+	reference = handle.output(('symbolic-ref', 'HEAD'))
+	parent = None
+	head = handle.object_info('HEAD')
+	handle.close()
+	if head != None:
+		parent = head[0]
+
+	process = handle.popen(('fast-import', '--quiet'), stdin=subprocess.PIPE)
+	for (day, number) in iter_pixel_commits(days, commits):
+		for i in range(0, number):
+			git.write_fast_import_commit(process.stdin, reference, username, email, day, username, email, day, "Update README", parent=parent)
+			parent = None
+	process.stdin.close()
+	if process.wait() != 0:
+		raise Exception("git fast-import failed with status %d." % (process.returncode))
+
+
+"""Draws pixels in the activity graph by writing a packfile, without any git process.
+
+Makes the same empty commits as draw_pixels, on top of the current branch.
+The commits have the empty tree, as in the repositories made by create_repository.
+
+Args:
+	repository: The name of the directory where the repository is.
+	username: The name to commit under (author AND committer).
+	email: The email to commit under (author AND committer).
+	days: The dates of the days where the pixels should be, as timestamps.
+	commits: The number of commits for every pixel, or a list with the number of commits of each pixel (see plan_commits).
+"""
+def draw_pixels_pack(repository, username, email, days, commits = DEFAULT_COMMITS):
+	git_directory = os.path.join(repository, '.git')
+	(reference, parent) = packfile.resolve_reference(git_directory, 'HEAD')
+
+	writer = packfile.PackWriter(git_directory)
+	tree = writer.add('tree', packfile.make_tree([]))
+	for (day, number) in iter_pixel_commits(days, commits):
+		for i in range(0, number):
+			parents = []
+			if parent != None:
+				parents.append(parent)
+			parent = writer.add('commit', packfile.make_commit(tree, parents, username, email, day, username, email, day, "Update README"))
+	writer.close()
+
+	if parent != None:
+		packfile.update_reference(git_directory, reference, parent)
+
+
+"""Parses a date of a dates file.
+
+Args:
+	text: The date, as day:month:year or as an ISO date (year-month-day).
+
+Returns:
+	The date.
+"""
+def parse_date(text):
+	if ':' in text:
+		(day, month, year) = text.split(':')
+		return datetime.date(year=int(year), month=int(month), day=int(day))
+	return datetime.date.fromisoformat(text)
+
+
+"""Parses a line of a dates file.
+
+A line holds a date or a range of dates (first..last, both included),
+optionally followed by the number of commits to make on each of these days.
+Empty lines and lines starting with # are ignored.
+
+Args:
+	line: The line.
+
+Returns:
+	A generator of tuples with the day (as a proleptic Gregorian ordinal) and the number of commits (None if not given).
+"""
+def parse_date_line(line):
+	fields = line.split()
+	if len(fields) == 0 or fields[0].startswith('#'):
+		return
+	if len(fields) > 2:
+		raise ValueError("Too many fields.")
+	count = None
+	if len(fields) == 2:
+		count = int(fields[1])
+	(first, _, last) = fields[0].partition('..')
+	first_day = parse_date(first).toordinal()
+	last_day = first_day
+	if last:
+		last_day = parse_date(last).toordinal()
+	for day in range(first_day, last_day + 1):
+		yield (day, count)
+
+
+"""Gets the day of a tuple with a day and its number of commits, to sort them by day only.
+
+Args:
+	day: The tuple with the day and the number of commits.
+
+Returns:
+	The day.
+"""
+def get_day(day):
+	return day[0]
+
+
+"""Deduplicates days with their number of commits.
+
+When a day is given several times, the largest number of commits is kept (a given number is larger than None).
+
+Args:
+	days: The tuples with the day and the number of commits, sorted.
+
+Returns:
+	A generator of the tuples, without duplicates.
 """
-def draw_pixels(repository, username, email, days):
-	os.environ["GIT_COMMITTER_NAME"] = username
-	os.environ["GIT_COMMITTER_EMAIL"] = email
+def merge_days(days):
+	previous = None
+	for (day, count) in days:
+		if previous != None and previous[0] == day:
+			if count != None and (previous[1] == None or count > previous[1]):
+				previous = (day, count)
+			continue
+		if previous != None:
+			yield previous
+		previous = (day, count)
+	if previous != None:
+		yield previous
+
+
+"""Writes a sorted chunk of days to a temporary file.
 
-	os.chdir(repository)
-	for day in days:
-		for i in range(0, 40):
-			os.environ["GIT_COMMITTER_DATE"] = str(day)
-			os.system("""git commit --allow-empty -q -m "Update README" --author="%s <%s>" --date=%d""" % (username, email, day))
-	os.chdir('..')
+Args:
+	days: The tuples with the day and the number of commits, sorted.
+
+Returns:
+	The temporary file, at its beginning.
+"""
+def write_chunk(days):
+	chunk = tempfile.TemporaryFile('w+')
+	for (day, count) in days:
+		chunk.write("%d %d\n" % (day, -1 if count == None else count))
+	chunk.seek(0)
+	return chunk
+
+
+"""Reads a chunk of days written by write_chunk.
+
+Args:
+	chunk: The temporary file.
+
+Returns:
+	A generator of the tuples with the day and the number of commits.
+"""
+def read_chunk(chunk):
+	for line in chunk:
+		(day, count) = line.split()
+		count = int(count)
+		yield (int(day), None if count < 0 else count)
+	chunk.close()
+
+
+"""Reads the days from a dates file, sorted and without duplicates.
+
+The file is read as a stream: the days are sorted by chunks which are written to temporary files and then merged,
+so that the memory used doesn't depend on the size of the file.
+See parse_date_line for the format of the file.
+
+Args:
+	dates_file: The path to the dates file.
+	chunk_size: The maximum number of days sorted in memory.
+
+Returns:
+	A generator of tuples with the timestamp of the day and the number of commits (None if not given).
+"""
+def iter_dates(dates_file, chunk_size = 100000):
+	chunks = []
+	days = []
+	fh = open(dates_file, 'r')
+	for (num_line, line) in enumerate(fh, 1):
+		try:
+			for day in parse_date_line(line):
+				days.append(day)
+				if len(days) >= chunk_size:
+					days.sort(key=get_day)
+					chunks.append(write_chunk(merge_days(days)))
+					days = []
+		except ValueError as error:
+			fh.close()
+			raise Exception("Invalid date on line %d of %s: %s" % (num_line, dates_file, error))
+	fh.close()
+
+	days.sort(key=get_day)
+	if len(chunks) == 0:
+		merged = merge_days(days)
+	else:
+		chunks.append(write_chunk(merge_days(days)))
+		days = None
+		merged = merge_days(heapq.merge(*[read_chunk(chunk) for chunk in chunks], key=get_day))
+
+	# As in compute_dates, each pixel is a minute later in the day than the previous one:
+	time_in_day = 5 * 3600 + random.randint(0, 60)
+	for (day, count) in merged:
+		date = datetime.date.fromordinal(day)
+		yield (int(time.mktime(date.timetuple())) + time_in_day, count)
+		time_in_day += 60
 
 
 """Reads the dates from the list file.
@@ -159,52 +517,78 @@ def draw_pixels(repository, username, email, days):
 The dates must be in a file under the format:
 day1:month1:year1
 day2:month2:year2
+The other formats of iter_dates are also accepted, but the numbers of commits are ignored.
 
 Args:
-	dates_file
+	dates_file: The path to the dates file.
+
+Returns:
+	The timestamps of the days, sorted and without duplicates.
 """
 def read_dates(dates_file):
-	dates = []
-	time_in_day = 5 * 3600 + random.randint(0, 60)
-	fh = open(dates_file, 'r')
-	for line in fh:
-		date_components = line.split(":")
-		if len(date_components) == 3:
-			year = int(date_components[2])
-			month = int(date_components[1])
-			day = int(date_components[0])
-			date = datetime.date(year=year, month=month, day=day)
-
-			time_in_day += 60
-			timestamp = int(time.mktime(day.timetuple())) + time_in_day
-			dates.append(timestamp)
-	return dates
+	return [timestamp for (timestamp, count) in iter_dates(dates_file)]
+
+
+"""Splits the pixels read from a dates file into the days and their number of commits.
+
+The two are read in lockstep by the drawing functions, so the pixels are still streamed.
+
+Args:
+	pixels: The tuples with the timestamp of the day and the number of commits (None if not given).
+	commits: The number of commits for the pixels without one.
+
+Returns:
+	A tuple with the iterator of the days and the iterator of the numbers of commits.
+"""
+def split_pixels(pixels, commits):
+	(days, counts) = itertools.tee(pixels)
+	return ((day for (day, count) in days), (commits if count == None else count for (day, count) in counts))
 
 
 """Draws pixels in the activity graph of some GitHub user.
 
-Usage: git_pixel.py <repository> <source> <username> <email>
+Usage: git_pixel.py [--engine=<engine>] [--commits=<number>|--existing=<repository>|--histogram=<file>] <repository> <source> <username> <email>
 
 Args:
 	repository: The name for the repository to create.
-	date-file: Source for the pixel's indexes. Can be a path to a file with dates or a simple string.
+	date-file: Source for the pixel's indexes. Can be a path to a file with dates (see iter_dates) or a simple string.
 	username: The GitHub user's name
 	email: The email for the GitHub user.
+	engine: The engine writing the commits, commit (one git commit per commit, default), fast-import (one stream) or pack (a packfile written without git).
+	commits: The number of commits per pixel for the darkest shade (40 by default).
+	existing: A local repository with the existing commits of the user, to only make the commits needed (see plan_commits).
+	histogram: Same as existing, but the commits are counted from a histogram.json document saved by frankenstein.py (in the .git directory).
 """
 if __name__ == "__main__":
-	if len(sys.argv) < 3:
-		print("Usage: git_pixel.py <repository> <source> <username> <email>")
+	(arguments, options) = command_line.parse_arguments(sys.argv[1:])
+	if len(arguments) < 4:
+		print("Usage: git_pixel.py [--engine=<engine>] [--commits=<number>|--existing=<repository>|--histogram=<file>] <repository> <source> <username> <email>")
 		sys.exit(2)
 
-	repository = sys.argv[1]
-	source = sys.argv[2]
-	username = sys.argv[3]
-	email = sys.argv[4]
+	repository = arguments[0]
+	source = arguments[1]
+	username = arguments[2]
+	email = arguments[3]
+	engine = options.get('engine', 'commit')
+
+	existing = None
+	if 'existing' in options:
+		existing = read_existing_counts(options['existing'], email)
+	elif 'histogram' in options:
+		existing = load_existing_counts(options['histogram'], email)
+	commits = int(options.get('commits', DEFAULT_COMMITS))
 
 	create_repository(repository)
-	dates = []
 	if os.path.isfile(source):
-		dates = read_dates(source)
+		pixels = iter_dates(source)
+		if existing != None:
+			# The busiest day depends on all the pixels, so they are read at once:
+			pixels = list(pixels)
+			dates = [day for (day, count) in pixels]
+			planned = plan_commits(dates, None, existing)
+			commits = [planned[i] if pixels[i][1] == None else pixels[i][1] for i in range(0, len(pixels))]
+		else:
+			(dates, commits) = split_pixels(pixels, commits)
 	else:
 		try:
 			string_encoding = compute_string_encoding(source)
@@ -213,4 +597,17 @@ if __name__ == "__main__":
 			sys.exit(3)
 		start_date = int(time.mktime(datetime.date(year=2013, month=11, day=3).timetuple()))
 		dates = compute_dates(start_date, string_encoding)
-	draw_pixels(repository, username, email, dates)
+		shades = compute_shades(string_encoding)
+		if existing != None:
+			commits = plan_commits(dates, shades, existing)
+		else:
+			commits = [max(1, commits * shade // LEVELS) for shade in shades]
+	if isinstance(commits, list):
+		print("%d commits for %d pixels." % (sum(commits), len(commits)))
+
+	if engine == 'fast-import':
+		draw_pixels_batch(repository, username, email, dates, commits)
+	elif engine == 'pack':
+		draw_pixels_pack(repository, username, email, dates, commits)
+	else:
+		draw_pixels(repository, username, email, dates, commits)
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+import bisect
+import json
+import os
+import commit_log
+import git
+
+"""Builds the daily commit histogram of a repository.
+
+Counts the commits per author and per UTC day (number of days since the epoch), using the author dates.
+For each author, the days are sorted and the counts are accumulated,
+such that the number of commits in any range of days is found with a binary search.
+The counts for all the authors together are stored under the all key.
+
+Args:
+	logs: The git logs as a Python array.
+	head: The hash of the commit the logs were taken at.
+
+Returns:
+	The histogram as a Python dictionary.
+"""
+def build_histogram(logs, head):
+	dates = commit_log.column(logs, 'author-date')
+	emails = commit_log.column(logs, 'author-email')
+	counts_per_author = {}
+	all_counts = {}
+	for i in range(0, len(dates)):
+		day = dates[i] // (24 * 3600)
+		counts = counts_per_author.setdefault(emails[i], {})
+		counts[day] = counts.get(day, 0) + 1
+		all_counts[day] = all_counts.get(day, 0) + 1
+
+	authors = {}
+	for (author, counts) in counts_per_author.items():
+		authors[author] = make_series(counts)
+	return {'head': head, 'all': make_series(all_counts), 'authors': authors}
+
+
+"""Converts daily counts to a series of sorted days with the accumulated counts.
+
+Args:
+	counts: The number of commits per day, as a dictionary.
+
+Returns:
+	The series as a dictionary with the sorted days and the accumulated counts.
+"""
+def make_series(counts):
+	days = sorted(counts)
+	accumulated = []
+	total = 0
+	for day in days:
+		total += counts[day]
+		accumulated.append(total)
+	return {'days': days, 'accumulated': accumulated}
+
+
+"""Gets the series of daily counts of an author.
+
+Args:
+	histogram: The daily commit histogram.
+	author: The email address of the author or None for all authors.
+
+Returns:
+	The series of daily counts, empty if the author has no commits.
+"""
+def get_series(histogram, author):
+	if author == None:
+		return histogram['all']
+	return histogram['authors'].get(author, {'days': [], 'accumulated': []})
+
+
+"""Counts the commits of an author in a range of days.
+
+Args:
+	histogram: The daily commit histogram.
+	author: The email address of the author or None for all authors.
+	first_day: The first day of the range (days since the epoch), included.
+	last_day: The last day of the range (days since the epoch), included.
+
+Returns:
+	The number of commits.
+"""
+def count_commits(histogram, author, first_day, last_day):
+	series = get_series(histogram, author)
+	start = bisect.bisect_left(series['days'], first_day)
+	end = bisect.bisect_right(series['days'], last_day)
+	if end <= start:
+		return 0
+	total = series['accumulated'][end - 1]
+	if start > 0:
+		total -= series['accumulated'][start - 1]
+	return total
+
+
+"""Counts all the commits of an author.
+
+Args:
+	histogram: The daily commit histogram.
+	author: The email address of the author or None for all authors.
+
+Returns:
+	The number of commits.
+"""
+def count_all_commits(histogram, author = None):
+	series = get_series(histogram, author)
+	if len(series['accumulated']) == 0:
+		return 0
+	return series['accumulated'][-1]
+
+
+"""Gets the number of commits of an author per day.
+
+Args:
+	histogram: The daily commit histogram.
+	author: The email address of the author or None for all authors.
+
+Returns:
+	The number of commits per UTC day (days since the epoch), as a dictionary.
+"""
+def get_daily_counts(histogram, author = None):
+	series = get_series(histogram, author)
+	counts = {}
+	previous = 0
+	for (day, accumulated) in zip(series['days'], series['accumulated']):
+		counts[day] = accumulated - previous
+		previous = accumulated
+	return counts
+
+
+"""Checks if an author may have a streak of commits in a window of time.
+
+A window of days * 24 hours covers at most days + 1 UTC days,
+so this check never rejects a streak that find_50commits_month would find.
+It can however accept windows which are slightly too long.
+
+Args:
+	histogram: The daily commit histogram.
+	author: The email address of the author or None for all authors.
+	days: The length of the window, in days.
+	min_commits: The minimum number of commits in the window.
+
+Returns:
+	False if the author has no such streak.
+"""
+def has_streak(histogram, author, days, min_commits):
+	if count_all_commits(histogram, author) < min_commits:
+		return False
+	for day in get_series(histogram, author)['days']:
+		if count_commits(histogram, author, day - days, day) >= min_commits:
+			return True
+	return False
+
+
+"""Saves the daily commit histogram in the git directory of the repository.
+
+Args:
+	repository: The name of the folder where the repository is.
+	histogram: The daily commit histogram.
+"""
+def save_histogram(repository, histogram):
+	json_data = open(os.path.join(git.get_git_directory(repository), 'histogram.json'), 'w')
+	json.dump(histogram, json_data)
+	json_data.close()
+
+
+"""Loads the daily commit histogram saved in the git directory of the repository.
+
+Args:
+	repository: The name of the folder where the repository is.
+	head: The hash of the current commit of the repository.
+
+Returns:
+	The daily commit histogram.
+	None if no histogram was saved or if it was built for another commit.
+"""
+def load_histogram(repository, head):
+	path = os.path.join(git.get_git_directory(repository), 'histogram.json')
+	if not os.path.isfile(path):
+		return None
+	json_data = open(path)
+	histogram = json.load(json_data)
+	json_data.close()
+	if histogram['head'] != head:
+		return None
+	return histogram
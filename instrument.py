@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+import contextlib
+import cProfile
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+"""The measures of the phases run so far, in the order they ended.
+"""
+PHASES = []
+
+"""The number of processes created since enable was called and the number of phases running.
+"""
+COUNTERS = {'subprocesses': 0, 'depth': 0}
+
+"""The profiler of the phases, if profiling is enabled.
+"""
+PROFILER = None
+
+
+"""Enables the counting of the processes created and, optionally, the profiling of the phases.
+
+The processes are counted by wrapping os.system and subprocess.Popen (which all the subprocess functions use).
+Only the processes created by the current process are counted, not those of a multiprocessing pool.
+
+Args:
+	profile: True to profile the phases with cProfile.
+"""
+def enable(profile = False):
+	global PROFILER
+	if profile:
+		PROFILER = cProfile.Profile()
+
+	system = os.system
+	def counted_system(command):
+		COUNTERS['subprocesses'] += 1
+		return system(command)
+	os.system = counted_system
+
+	popen_init = subprocess.Popen.__init__
+	def counted_popen_init(self, *args, **kwargs):
+		COUNTERS['subprocesses'] += 1
+		popen_init(self, *args, **kwargs)
+	subprocess.Popen.__init__ = counted_popen_init
+
+
+"""Counts the bytes written so far.
+
+The bytes written by the current process are read from /proc/self/io (Linux only).
+The bytes written by the child processes which ended are estimated from their blocks written to disk.
+
+Returns:
+	The number of bytes written.
+"""
+def count_bytes_written():
+	written = resource.getrusage(resource.RUSAGE_CHILDREN).ru_oublock * 512
+	try:
+		io = open('/proc/self/io')
+		for line in io:
+			(name, value) = line.split(':')
+			if name == 'wchar':
+				written += int(value)
+		io.close()
+	except IOError:
+		pass
+	return written
+
+
+"""Takes a snapshot of the counters.
+
+Returns:
+	A tuple with the wall time, the CPU time (of the current process and of the child processes which ended),
+	the number of processes created and the number of bytes written.
+"""
+def snapshot():
+	times = os.times()
+	cpu_time = times.user + times.system + times.children_user + times.children_system
+	return (time.perf_counter(), cpu_time, COUNTERS['subprocesses'], count_bytes_written())
+
+
+"""Measures a phase of the program.
+
+Used as a context manager: with instrument.phase('dump_logs'): ...
+The measures are added to PHASES when the phase ends, even if it ends with an exception.
+If profiling is enabled, the phase is profiled.
+
+Args:
+	name: The name of the phase.
+"""
+@contextlib.contextmanager
+def phase(name):
+	start = snapshot()
+	# Only the outermost phase enables the profiler:
+	profiling = PROFILER != None and COUNTERS['depth'] == 0
+	if profiling:
+		PROFILER.enable()
+	COUNTERS['depth'] += 1
+	try:
+		yield
+	finally:
+		COUNTERS['depth'] -= 1
+		if profiling:
+			PROFILER.disable()
+		end = snapshot()
+		PHASES.append({
+			'phase': name,
+			'wall-time': end[0] - start[0],
+			'cpu-time': end[1] - start[1],
+			'subprocesses': end[2] - start[2],
+			'bytes-written': end[3] - start[3]
+		})
+
+
+"""Builds the report of the phases measured.
+
+Returns:
+	The report as a Python dictionary, with the command line, the date and the measures of each phase.
+"""
+def build_report():
+	return {
+		'command': sys.argv,
+		'date': int(time.time()),
+		'phases': PHASES
+	}
+
+
+"""Writes the report of the phases measured as a JSON document.
+
+Args:
+	path: The path to the JSON document.
+"""
+def write_report(path):
+	json_data = open(path, 'w')
+	json.dump(build_report(), json_data, indent=2)
+	json_data.close()
+
+
+"""Writes the profile of the phases in the pstats format.
+
+Args:
+	path: The path to the profile file.
+"""
+def write_profile(path):
+	if PROFILER != None:
+		PROFILER.dump_stats(path)
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+import binascii
+import hashlib
+import os
+import struct
+import zlib
+
+"""The type numbers of the git objects in packfiles.
+"""
+OBJECT_TYPES = {
+	'commit': 1,
+	'tree': 2,
+	'blob': 3
+}
+
+
+"""Writes git objects in a packfile, without any git process.
+
+The objects are compressed with zlib and appended to a temporary packfile as they are added.
+When the writer is closed, the packfile is completed with its checksum and indexed (version 2 index),
+then both are moved to the objects/pack directory of the repository.
+Objects are never stored as deltas.
+
+Attributes:
+	git_directory: The git directory of the repository (e.g. repository/.git).
+	path: The path to the temporary packfile.
+	pack: The temporary packfile.
+	entries: The hash, CRC32 and offset of each object written.
+	hashes: The hashes of the objects written, to avoid duplicates.
+"""
+class PackWriter:
+	def __init__(self, git_directory):
+		self.git_directory = git_directory
+		self.path = os.path.join(git_directory, 'objects', 'pack', 'tmp_pack_frankenstein')
+		self.pack = open(self.path, 'w+b')
+		# The number of objects is rewritten when the writer is closed:
+		self.pack.write(b'PACK' + struct.pack('>II', 2, 0))
+		self.entries = []
+		self.hashes = set()
+
+	"""Adds an object to the packfile.
+
+	Args:
+		kind: The type of the object (commit, tree or blob).
+		data: The content of the object, as bytes.
+
+	Returns:
+		The hash of the object.
+	"""
+	def add(self, kind, data):
+		hash = hashlib.sha1(b'%s %d\0' % (kind.encode('ascii'), len(data)) + data).digest()
+		if hash in self.hashes:
+			return binascii.hexlify(hash).decode('ascii')
+
+		# The header holds the type and the size, 4 bits of size first then 7 bits per byte:
+		size = len(data)
+		byte = (OBJECT_TYPES[kind] << 4) | (size & 0x0f)
+		size >>= 4
+		header = bytearray()
+		while size:
+			header.append(byte | 0x80)
+			byte = size & 0x7f
+			size >>= 7
+		header.append(byte)
+		entry = bytes(header) + zlib.compress(data)
+
+		self.entries.append((hash, zlib.crc32(entry), self.pack.tell()))
+		self.hashes.add(hash)
+		self.pack.write(entry)
+		return binascii.hexlify(hash).decode('ascii')
+
+	"""Completes the packfile and its index and moves them to the repository.
+
+	Returns:
+		The name of the packfile, without extension.
+	"""
+	def close(self):
+		self.pack.seek(8)
+		self.pack.write(struct.pack('>I', len(self.entries)))
+		self.pack.seek(0)
+		checksum = hashlib.sha1()
+		while True:
+			chunk = self.pack.read(1024 * 1024)
+			if not chunk:
+				break
+			checksum.update(chunk)
+		pack_checksum = checksum.digest()
+		self.pack.write(pack_checksum)
+		self.pack.close()
+
+		name = 'pack-' + binascii.hexlify(pack_checksum).decode('ascii')
+		directory = os.path.join(self.git_directory, 'objects', 'pack')
+		index = write_index(self.entries, pack_checksum)
+		index_file = open(os.path.join(directory, name + '.idx'), 'wb')
+		index_file.write(index)
+		index_file.close()
+		os.rename(self.path, os.path.join(directory, name + '.pack'))
+		return name
+
+
+"""Builds the version 2 index of a packfile.
+
+Args:
+	entries: The hash, CRC32 and offset of each object in the packfile.
+	pack_checksum: The checksum of the packfile.
+
+Returns:
+	The index, as bytes.
+"""
+def write_index(entries, pack_checksum):
+	entries = sorted(entries)
+	index = bytearray(b'\xfftOc' + struct.pack('>I', 2))
+
+	# Number of objects whose first byte is lower or equal to each byte value:
+	fanout = [0] * 256
+	for (hash, crc, offset) in entries:
+		fanout[hash[0]] += 1
+	total = 0
+	for i in range(0, 256):
+		total += fanout[i]
+		index += struct.pack('>I', total)
+
+	for (hash, crc, offset) in entries:
+		index += hash
+	for (hash, crc, offset) in entries:
+		index += struct.pack('>I', crc & 0xffffffff)
+	# Offsets which don't fit in 31 bits are stored in a second table of 64-bit offsets:
+	large_offsets = bytearray()
+	for (hash, crc, offset) in entries:
+		if offset < 0x80000000:
+			index += struct.pack('>I', offset)
+		else:
+			index += struct.pack('>I', 0x80000000 | (len(large_offsets) // 8))
+			large_offsets += struct.pack('>Q', offset)
+	index += large_offsets
+
+	index += pack_checksum
+	index += hashlib.sha1(index).digest()
+	return bytes(index)
+
+
+"""Builds the content of a commit object.
+
+Args:
+	tree: The hash of the tree of the commit.
+	parents: The hashes of the parent commits.
+	author: The author name.
+	author_email: The author email address.
+	author_date: The author date, as a timestamp.
+	committer: The committer name.
+	committer_email: The committer email address.
+	committer_date: The committer date, as a timestamp.
+	message: The commit message.
+
+Returns:
+	The content of the commit object, as bytes.
+"""
+def make_commit(tree, parents, author, author_email, author_date, committer, committer_email, committer_date, message):
+	lines = ["tree %s" % (tree)]
+	for parent in parents:
+		lines.append("parent %s" % (parent))
+	lines.append("author %s <%s> %d +0000" % (author, author_email, author_date))
+	lines.append("committer %s <%s> %d +0000" % (committer, committer_email, committer_date))
+	lines.append("")
+	lines.append(message)
+	return ("\n".join(lines) + "\n").encode('utf-8')
+
+
+"""Builds the content of a tree object.
+
+Args:
+	entries: The entries of the tree as tuples with the mode (e.g. 100644 or 40000), the name and the hash.
+
+Returns:
+	The content of the tree object, as bytes.
+"""
+def make_tree(entries):
+	# Git sorts the subdirectories as if their name ended with a slash:
+	def sort_key(entry):
+		(mode, name, hash) = entry
+		if mode == '40000':
+			return name + '/'
+		return name
+
+	tree = bytearray()
+	for (mode, name, hash) in sorted(entries, key=sort_key):
+		tree += ("%s %s\0" % (mode, name)).encode('utf-8')
+		tree += binascii.unhexlify(hash)
+	return bytes(tree)
+
+
+"""Creates an empty bare git repository.
+
+Args:
+	repository: The directory name for the new repository.
+"""
+def init_repository(repository):
+	for directory in ('objects/pack', 'objects/info', 'refs/heads', 'refs/tags'):
+		os.makedirs(os.path.join(repository, directory))
+	head = open(os.path.join(repository, 'HEAD'), 'w')
+	head.write("ref: refs/heads/master\n")
+	head.close()
+	config = open(os.path.join(repository, 'config'), 'w')
+	config.write("[core]\n\trepositoryformatversion = 0\n\tfilemode = true\n\tbare = true\n")
+	config.close()
+
+
+"""Counts the objects of a repository, without any git process.
+
+The loose objects are counted in their directories and the packed objects are read from the fanout tables of the pack indexes.
+The objects borrowed from alternates aren't counted.
+
+Args:
+	git_directory: The git directory of the repository.
+
+Returns:
+	The number of objects.
+"""
+def count_objects(git_directory):
+	count = 0
+	objects_directory = os.path.join(git_directory, 'objects')
+	for name in os.listdir(objects_directory):
+		# The loose objects are in directories named after the first byte of their hash:
+		if len(name) == 2:
+			count += len(os.listdir(os.path.join(objects_directory, name)))
+
+	pack_directory = os.path.join(objects_directory, 'pack')
+	if os.path.isdir(pack_directory):
+		for name in os.listdir(pack_directory):
+			if not name.endswith('.idx'):
+				continue
+			index_file = open(os.path.join(pack_directory, name), 'rb')
+			index = index_file.read(8 + 256 * 4)
+			index_file.close()
+			# The last entry of the fanout table is the number of objects, the version 1 indexes have no header:
+			fanout = 8 if index.startswith(b'\xfftOc') else 0
+			count += struct.unpack('>I', index[fanout + 255 * 4:fanout + 256 * 4])[0]
+	return count
+
+
+"""Resolves a reference of a repository.
+
+Follows the symbolic references (such as HEAD) and looks for the reference in the loose and packed references.
+
+Args:
+	git_directory: The git directory of the repository.
+	reference: The name of the reference (e.g. HEAD or refs/heads/master).
+
+Returns:
+	A tuple with the name of the reference once symbolic references are followed and its hash.
+	The hash is None if the reference doesn't exist yet.
+"""
+def resolve_reference(git_directory, reference):
+	path = os.path.join(git_directory, reference)
+	if os.path.isfile(path):
+		reference_file = open(path)
+		value = reference_file.read().strip()
+		reference_file.close()
+		if value.startswith('ref: '):
+			return resolve_reference(git_directory, value[5:])
+		return (reference, value)
+
+	path = os.path.join(git_directory, 'packed-refs')
+	if os.path.isfile(path):
+		packed_references = open(path)
+		for line in packed_references:
+			fields = line.split()
+			if len(fields) == 2 and fields[1] == reference:
+				packed_references.close()
+				return (reference, fields[0])
+		packed_references.close()
+	return (reference, None)
+
+
+"""Updates a reference of a repository.
+
+Args:
+	git_directory: The git directory of the repository.
+	reference: The name of the reference (e.g. refs/heads/master).
+	hash: The hash the reference must point to.
+"""
+def update_reference(git_directory, reference, hash):
+	path = os.path.join(git_directory, reference)
+	os.makedirs(os.path.dirname(path), exist_ok=True)
+	reference_file = open(path, 'w')
+	reference_file.write(hash + "\n")
+	reference_file.close()
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+import datetime
+import json
+import math
+import os
+import time
+import commit_log
+import git
+import packfile
+
+"""The estimated time to rebuild a commit with each method, in seconds.
+
+Measured with benchmark.py on a synthetic repository of 1000 commits modifying 3 files each.
+The time to dump the patches is included for the patches and index methods.
+"""
+COMMIT_COSTS = {
+	'patches': 0.029,
+	'index': 0.018,
+	'pipeline': 0.030,
+	'fast-import': 0.0004,
+	'shared': 0.00015,
+	'pack': 0.00015
+}
+
+"""The methods which write the trees and blobs again in the new repository, instead of sharing those of the existing one.
+"""
+COPYING_METHODS = ('patches', 'index', 'pipeline', 'fast-import')
+
+"""The characters of the contribution levels in the heatmap, from no contribution to the darkest level.
+"""
+LEVELS = ' .+*#'
+
+
+"""Loads the costs of the rebuild methods measured by benchmark.py.
+
+The cost of a method is the time of its last run divided by the number of commits.
+For the patches and index methods, the time to dump the patches is included.
+
+Args:
+	path: The path to the results of benchmark.py.
+
+Returns:
+	The time to rebuild a commit with each method, in seconds.
+	The default costs are kept for the methods which weren't measured.
+"""
+def load_costs(path):
+	costs = dict(COMMIT_COSTS)
+	results = open(path)
+	for line in results:
+		result = json.loads(line)
+		phases = {}
+		for phase in result['phases']:
+			phases[phase['phase']] = phase['wall-time']
+		if 'rebuild' not in phases:
+			continue
+		seconds = phases['rebuild']
+		method = result['parameters']['rebuild']
+		if method in ('patches', 'index'):
+			seconds += phases.get('dump_commits', 0)
+		costs[method] = seconds / result['parameters']['commits']
+	results.close()
+	return costs
+
+
+"""Counts the contributions of the user per day in the new repository.
+
+As for GitHub, a commit counts on the day of its author date (in local time), for its author.
+
+Args:
+	logs: The git logs as a Python array.
+	your_email: The email of the user.
+	contributors: The contributors to replace or all to replace all of them.
+	offset: The offset (in seconds) of which the commit's dates are shifted.
+	count: The number of commits copied.
+
+Returns:
+	The number of commits of the user per day, as a dictionary.
+"""
+def count_contributions(logs, your_email, contributors, offset, count):
+	dates = commit_log.column(logs, 'author-date')
+	emails = commit_log.column(logs, 'author-email')
+	contributions = {}
+	for i in range(0, count):
+		if contributors == 'all' or emails[i] in contributors or emails[i] == your_email:
+			day = datetime.date.fromtimestamp(dates[i] + offset)
+			contributions[day] = contributions.get(day, 0) + 1
+	return contributions
+
+
+"""Finds the email addresses replaced with the email of the user.
+
+Args:
+	logs: The git logs as a Python array.
+	contributors: The contributors to replace or all to replace all of them.
+	count: The number of commits copied.
+
+Returns:
+	The sorted list of email addresses replaced, among the authors and committers of the commits copied.
+"""
+def find_replaced_emails(logs, contributors, count):
+	emails = set(commit_log.column(logs, 'author-email')[:count])
+	emails.update(commit_log.column(logs, 'committer-email')[:count])
+	if contributors != 'all':
+		emails &= set(contributors)
+	return sorted(emails)
+
+
+"""Estimates the number of objects written and the time of each rebuild method.
+
+Args:
+	count: The number of commits copied.
+	source_objects: The number of objects in the existing repository.
+	costs: The time to rebuild a commit with each method, in seconds.
+
+Returns:
+	The estimates per method, as dictionaries with the number of objects and the time in seconds.
+"""
+def estimate_costs(count, source_objects, costs = COMMIT_COSTS):
+	estimates = {}
+	for (method, cost) in costs.items():
+		objects = count
+		if method in COPYING_METHODS:
+			# At most all the trees and blobs of the existing repository are written again:
+			objects += source_objects
+		estimates[method] = {'objects': objects, 'seconds': count * cost}
+	return estimates
+
+
+"""Plans the copy of a repository without writing anything.
+
+No git process is run: the objects of the existing repository are counted from its git directory.
+
+Args:
+	repository: The name of the folder where the existing repository is.
+	logs: The git logs as a CommitLog, with the dates already redistributed if needed.
+	strategy: The name of the strategy found.
+	contributors: The contributors to replace or all to replace all of them.
+	num_commit: The number of the commit to put today.
+	your_email: The email of the user.
+	costs: The time to rebuild a commit with each method, in seconds.
+
+Returns:
+	The plan as a Python dictionary.
+	The first and last dates are None if no commit is copied.
+"""
+def build_plan(repository, logs, strategy, contributors, num_commit, your_email, costs = COMMIT_COSTS):
+	offset = int(time.time()) - logs[num_commit]['author-date']
+	git_directory = os.path.join(repository, '.git')
+	if not os.path.isdir(git_directory):
+		# Bare repository:
+		git_directory = repository
+	count = git.count_past_commits(logs, offset)
+	contributions = count_contributions(logs, your_email, contributors, offset, count)
+
+	today = datetime.date.today()
+	last_month = [today - datetime.timedelta(days=i) for i in range(0, 29)]
+	return {
+		'strategy': strategy,
+		'last-commit': num_commit,
+		'offset': offset,
+		'commits': len(logs),
+		'copied-commits': count,
+		'replaced-emails': find_replaced_emails(logs, contributors, count),
+		'first-date': logs[0]['author-date'] + offset if count > 0 else None,
+		'last-date': logs[count - 1]['author-date'] + offset if count > 0 else None,
+		'last-month-commits': sum([contributions.get(day, 0) for day in last_month]),
+		'contributions': dict([(day.isoformat(), number) for (day, number) in sorted(contributions.items())]),
+		'estimates': estimate_costs(count, packfile.count_objects(git_directory), costs)
+	}
+
+
+"""Renders the contributions of the last weeks as in the GitHub contribution graph.
+
+There is a row per day of the week (Sunday first) and a column per week, the last column being the current week.
+As for GitHub, the levels are relative to the maximum number of contributions in a day.
+
+Args:
+	contributions: The number of contributions per day, with the days as ISO dates.
+	today: The last day of the graph.
+	weeks: The number of weeks in the graph.
+
+Returns:
+	The lines of the graph.
+"""
+def render_heatmap(contributions, today, weeks = 53):
+	# The graph starts on a Sunday, isoweekday is 7 for Sundays:
+	first_day = today - datetime.timedelta(days=today.isoweekday() % 7 + (weeks - 1) * 7)
+	counts = [contributions.get((first_day + datetime.timedelta(days=i)).isoformat(), 0) for i in range(0, weeks * 7)]
+	maximum = max(counts + [1])
+
+	lines = []
+	for (num_day, name) in enumerate(('Sun', 'Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat')):
+		cells = []
+		for week in range(0, weeks):
+			day = first_day + datetime.timedelta(days=week * 7 + num_day)
+			if day > today:
+				cells.append(' ')
+				continue
+			count = counts[week * 7 + num_day]
+			cells.append(LEVELS[math.ceil(4 * count / maximum)])
+		lines.append("%s %s" % (name, ''.join(cells)))
+	return lines
+
+
+"""Prints a plan.
+
+Args:
+	plan: The plan, as built by build_plan.
+"""
+def print_plan(plan):
+	print("Strategy: %s, commit %d put today (offset of %d seconds)" % (plan['strategy'], plan['last-commit'], plan['offset']))
+	print("Commits copied: %d of %d" % (plan['copied-commits'], plan['commits']))
+	if plan['copied-commits'] == 0:
+		print("No commit is copied: the first commit would already be in the future.")
+	elif plan['copied-commits'] < plan['commits']:
+		print("Reached current date after commit %d." % (plan['copied-commits'] - 1))
+	if plan['copied-commits'] > 0:
+		print("Dates: from %s to %s" % (time.ctime(plan['first-date']), time.ctime(plan['last-date'])))
+	emails = plan['replaced-emails']
+	print("Replaced email addresses (%d): %s" % (len(emails), ', '.join(emails[:10]) + (', ...' if len(emails) > 10 else '')))
+	print("Your commits in the last 29 days: %d" % (plan['last-month-commits']))
+	print()
+	for line in render_heatmap(plan['contributions'], datetime.date.today()):
+		print(line)
+	print()
+	for (method, estimate) in sorted(plan['estimates'].items(), key=lambda item: item[1]['seconds']):
+		print("%-12s ~%d objects, ~%.1fs" % (method, estimate['objects'], estimate['seconds']))